@@ -1,9 +1,18 @@
 import os
+import sys
 import json
+import mmap
+import struct
 import re
 import math
+import time
+import zlib
 import base64
+import hashlib
 import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from array import array
 
 import pymel.core as pm
 import maya.cmds as cmds
@@ -31,6 +40,9 @@ RootDirectory = os.path.dirname(__file__)
 PickerWindows = []
 Clipboard = []
 
+LoadThreadPool = ThreadPoolExecutor(max_workers=4) # parses pickers and decodes images while they are loaded
+SaveThreadPool = ThreadPoolExecutor(max_workers=1) # encodes pickers for the scene node one save at a time
+
 def safeExec(cmd):
     allowed_modules = ['cmds', 'pm']
     safe_globals = {name: globals()[name] for name in allowed_modules if name in globals()}
@@ -64,11 +76,16 @@ def size2scale(s):
     return 25 * (s/100.0 - 1.0)
 
 class PickerItem(object):
+    __slots__ = ["position", "background", "foreground", "image", "imageAspectRatio", "control", "label", "font",
+                 "script", "flat", "flipped", "rotated", "scale", "group", "svgpath"]
+
+    ListFields = ["position", "flipped", "scale"] # the rest are immutable values
+
     def __init__(self, svgpath="M 0 0 h 100 v 100 h -100 v -100 Z"):
         self.position = [0,0]
         self.background = "#eaa763"
         self.foreground = "#000000"
-        self.image = "" # pixmap bytes
+        self.image = "" # base64 pixmap bytes or path, raw JPEG/PNG bytes for images from binary pickers
         self.imageAspectRatio = 0 # 0-IgnoreAspectRatio, 1-KeepAspectRatio, 2-KeepAspectRatioByExpanding
         self.control = ""
         self.label = ""
@@ -99,15 +116,22 @@ class PickerItem(object):
         self.svgpath = other.svgpath
 
     def duplicate(self):
-        a = PickerItem()
+        a = PickerItem.__new__(PickerItem) # all fields are set by copy
         a.copy(self)
         return a
 
-    def toJson(self):
-        return {"position":self.position,
+    def snapshot(self, fields): # values of the fields, immutable ones (strings, image bytes) are shared
+        return [getattr(self, f)[:] if f in PickerItem.ListFields else getattr(self, f) for f in fields]
+
+    def restore(self, fields, values):
+        for f, v in zip(fields, values):
+            setattr(self, f, v[:] if f in PickerItem.ListFields else v)
+
+    def toJson(self, tables=None):
+        data = {"position":self.position,
                 "background":self.background,
                 "foreground":self.foreground,
-                "image":self.image,
+                "image":imageString(self.image),
                 "imageAspectRatio":self.imageAspectRatio,
                 "control":self.control,
                 "label": self.label,
@@ -119,23 +143,68 @@ class PickerItem(object):
                 "scale":self.scale,
                 "group":self.group,
                 "svgpath":self.svgpath}
+        return tables.shareItem(data) if tables else data
 
-    def fromJson(self, data):
+    def fromJson(self, data, tables=None):
+        # repeated strings like colors and paths are interned, so items share them
         self.position = data["position"]
-        self.background = data["background"]
-        self.foreground = data["foreground"]
-        self.image = data["image"]
+        if "style" in data: # shared tables
+            self.background, self.foreground, self.font = tables.styles[data["style"]]
+        else:
+            self.background = sys.intern(data["background"])
+            self.foreground = sys.intern(data["foreground"])
+            self.font = sys.intern(data.get("font", ""))
+        self.image = tables.images[data["image"]] if tables else data["image"]
         self.imageAspectRatio = data["imageAspectRatio"]
         self.control = data["control"]
         self.label = data["label"]
-        self.font = data.get("font", "")
         self.script = data["script"]
         self.flat = data["flat"]
         self.flipped = data["flipped"]
         self.rotated = data["rotated"]
         self.scale = data["scale"]
-        self.group = data["group"]
-        self.svgpath = data["svgpath"]
+        self.group = sys.intern(data["group"])
+        self.svgpath = tables.shapes[data["shape"]] if "shape" in data else sys.intern(data["svgpath"])
+
+class PickerTables(object): # shapes, styles and images written once per picker, items refer to them by index
+    def __init__(self, shapes=[], styles=[], images=[]):
+        self.shapes = [sys.intern(s) for s in shapes]
+        self.styles = [tuple(sys.intern(s) for s in style) for style in styles] # background, foreground, font
+        self.images = list(images)
+        self._shapeIndices = {s:i for i, s in enumerate(self.shapes)}
+        self._styleIndices = {s:i for i, s in enumerate(self.styles)}
+        self._imageIndices = {s:i for i, s in enumerate(self.images)}
+
+    @staticmethod
+    def tableIndex(table, indices, value):
+        idx = indices.get(value)
+        if idx is None:
+            idx = len(table)
+            table.append(value)
+            indices[value] = idx
+        return idx
+
+    def shapeIndex(self, svgpath):
+        return PickerTables.tableIndex(self.shapes, self._shapeIndices, svgpath)
+
+    def imageIndex(self, image):
+        return PickerTables.tableIndex(self.images, self._imageIndices, image)
+
+    def styleIndex(self, background, foreground, font):
+        return PickerTables.tableIndex(self.styles, self._styleIndices, (background, foreground, font))
+
+    def shareItem(self, data): # replace item's path, style and image strings with table indices
+        data["shape"] = self.shapeIndex(data.pop("svgpath"))
+        data["style"] = self.styleIndex(data.pop("background"), data.pop("foreground"), data.pop("font"))
+        data["image"] = self.imageIndex(data["image"])
+        return data
+
+    def toJson(self):
+        return {"shapes": self.shapes, "styles": [list(style) for style in self.styles], "images": self.images}
+
+    @staticmethod
+    def fromJson(data): # None for pickers without tables
+        return PickerTables(data["shapes"], data["styles"], data["images"]) if "shapes" in data else None
 
 class Picker(object):
     def __init__(self, name=""):
@@ -143,12 +212,14 @@ class Picker(object):
         self.items = []
         self.size = [0,0]
         self.scale = 1
+        self.shadows = True
 
     def copy(self, other):
         self.name = other.name
         self.items = [item.duplicate() for item in other.items]
         self.size = other.size[:]
         self.scale = other.scale
+        self.shadows = other.shadows
 
     def isEmpty(self):
         return len(self.items)==0
@@ -158,20 +229,556 @@ class Picker(object):
         a.copy(self)
         return a
 
-    def toJson(self):
-        return {"name": self.name, "items": [item.toJson() for item in self.items], "size":self.size, "scale": self.scale}
+    def toJson(self, sharedTables=False): # with shared tables each path and style is written once
+        tables = PickerTables() if sharedTables else None
+        data = {"name": self.name, "items": [item.toJson(tables) for item in self.items], "size":self.size, "scale": self.scale, "shadows": self.shadows}
+        if tables:
+            data.update(tables.toJson())
+        return data
 
     def fromJson(self, data):
         self.name = data["name"]
         self.size = data["size"]
         self.scale = data.get("scale", 1)
+        self.shadows = data.get("shadows", True)
 
+        tables = PickerTables.fromJson(data)
         self.items = []
         for d in data["items"]:
             item = PickerItem()
-            item.fromJson(d)
+            item.fromJson(d, tables)
             self.items.append(item)
 
+class PickerDocument(object): # compact picker storage, items are kept in arrays instead of objects
+    StringFields = ["background", "foreground", "image", "control", "label", "font", "script", "group", "svgpath"]
+
+    FlatFlag = 1
+    FlipXFlag = 2
+    FlipYFlag = 4
+    RotatedFlag = 8
+
+    def __init__(self, name=""):
+        self.name = name
+        self.size = [0,0]
+        self.scale = 1
+        self.shadows = True
+
+        self.positions = array("d") # x0, y0, x1, y1, ...
+        self.scales = array("d") # x0, y0, x1, y1, ...
+        self.flags = array("B")
+        self.imageAspectRatios = array("B")
+        self.stringFields = {field: array("I") for field in PickerDocument.StringFields} # indices in self.strings
+
+        self.strings = [] # each distinct string once
+        self._stringIndices = {}
+
+    def __len__(self):
+        return len(self.flags)
+
+    def isEmpty(self):
+        return len(self)==0
+
+    def stringIndex(self, s):
+        idx = self._stringIndices.get(s)
+        if idx is None:
+            idx = len(self.strings)
+            self.strings.append(s)
+            self._stringIndices[s] = idx
+        return idx
+
+    def appendItem(self, item):
+        self.positions.extend(item.position)
+        self.scales.extend(item.scale)
+        self.flags.append((PickerDocument.FlatFlag if item.flat else 0) |
+                          (PickerDocument.FlipXFlag if item.flipped[0] else 0) |
+                          (PickerDocument.FlipYFlag if item.flipped[1] else 0) |
+                          (PickerDocument.RotatedFlag if item.rotated else 0))
+        self.imageAspectRatios.append(item.imageAspectRatio)
+
+        for field in PickerDocument.StringFields:
+            self.stringFields[field].append(self.stringIndex(getattr(item, field)))
+
+    def item(self, idx):
+        flags = self.flags[idx]
+        strings = self.strings
+
+        item = PickerItem.__new__(PickerItem)
+        item.position = [self.positions[idx*2], self.positions[idx*2+1]]
+        item.scale = [self.scales[idx*2], self.scales[idx*2+1]]
+        item.flat = bool(flags & PickerDocument.FlatFlag)
+        item.flipped = [bool(flags & PickerDocument.FlipXFlag), bool(flags & PickerDocument.FlipYFlag)]
+        item.rotated = bool(flags & PickerDocument.RotatedFlag)
+        item.imageAspectRatio = self.imageAspectRatios[idx]
+
+        for field in PickerDocument.StringFields:
+            setattr(item, field, strings[self.stringFields[field][idx]])
+        return item
+
+    def items(self):
+        return [self.item(i) for i in range(len(self))]
+
+    def duplicate(self):
+        a = PickerDocument(self.name)
+        a.size = self.size[:]
+        a.scale = self.scale
+        a.shadows = self.shadows
+        a.positions = array("d", self.positions)
+        a.scales = array("d", self.scales)
+        a.flags = array("B", self.flags)
+        a.imageAspectRatios = array("B", self.imageAspectRatios)
+        a.stringFields = {field: array("I", indices) for field, indices in self.stringFields.items()}
+        a.strings = self.strings[:] # strings are immutable and shared
+        a._stringIndices = dict(self._stringIndices)
+        return a
+
+    @staticmethod
+    def fromPicker(picker):
+        doc = PickerDocument(picker.name)
+        doc.size = picker.size[:]
+        doc.scale = picker.scale
+        doc.shadows = picker.shadows
+        for item in picker.items:
+            doc.appendItem(item)
+        return doc
+
+    def toPicker(self):
+        picker = Picker(self.name)
+        picker.size = self.size[:]
+        picker.scale = self.scale
+        picker.shadows = self.shadows
+        picker.items = self.items()
+        return picker
+
+    @staticmethod
+    def tableColumn(column): # values to indices in a table of distinct values in order of first use, and the table
+        indices = {}
+        for value in column:
+            if value not in indices:
+                indices[value] = len(indices)
+        return list(map(indices.__getitem__, column)), list(indices)
+
+    def toJson(self, sharedTables=False):
+        # whole columns are resolved at once, strings through their indices, so each distinct string is converted once
+        strings = self.strings
+        column = lambda field: list(map(strings.__getitem__, self.stringFields[field]))
+        pairs = lambda values: list(map(list, zip(values[0::2], values[1::2])))
+
+        flagValues = [(bool(f & PickerDocument.FlatFlag), bool(f & PickerDocument.FlipXFlag), bool(f & PickerDocument.FlipYFlag), bool(f & PickerDocument.RotatedFlag)) for f in range(16)]
+        flags = [flagValues[f] for f in self.flags]
+        flats = [f[0] for f in flags]
+        flips = [[f[1], f[2]] for f in flags]
+        rotations = [f[3] for f in flags]
+
+        common = [pairs(self.positions), None, self.imageAspectRatios.tolist(), column("control"), column("label"), column("script"),
+                  flats, flips, rotations, pairs(self.scales), column("group")]
+
+        if not sharedTables:
+            imageStrings = {idx: imageString(strings[idx]) for idx in set(self.stringFields["image"])}
+            common[1] = list(map(imageStrings.__getitem__, self.stringFields["image"]))
+
+            items = [{"position":position,
+                      "background":background,
+                      "foreground":foreground,
+                      "image":image,
+                      "imageAspectRatio":imageAspectRatio,
+                      "control":control,
+                      "label": label,
+                      "font": font,
+                      "script": script,
+                      "flat":flat,
+                      "flipped":flipped,
+                      "rotated":rotated,
+                      "scale":scale,
+                      "group":group,
+                      "svgpath":svgpath}
+                     for position, image, imageAspectRatio, control, label, script, flat, flipped, rotated, scale, group, background, foreground, font, svgpath
+                     in zip(*common + [column("background"), column("foreground"), column("font"), column("svgpath")])]
+
+            return {"name": self.name, "items": items, "size":self.size, "scale": self.scale, "shadows": self.shadows}
+
+        # same tables and item layout as PickerTables.shareItem
+        shapes, shapeTable = PickerDocument.tableColumn(self.stringFields["svgpath"])
+        styles, styleTable = PickerDocument.tableColumn(list(zip(self.stringFields["background"], self.stringFields["foreground"], self.stringFields["font"])))
+        common[1], imageTable = PickerDocument.tableColumn(self.stringFields["image"])
+
+        items = [{"position":position,
+                  "image":image,
+                  "imageAspectRatio":imageAspectRatio,
+                  "control":control,
+                  "label": label,
+                  "script": script,
+                  "flat":flat,
+                  "flipped":flipped,
+                  "rotated":rotated,
+                  "scale":scale,
+                  "group":group,
+                  "shape":shape,
+                  "style":style}
+                 for position, image, imageAspectRatio, control, label, script, flat, flipped, rotated, scale, group, shape, style
+                 in zip(*common + [shapes, styles])]
+
+        return {"name": self.name, "items": items, "size":self.size, "scale": self.scale, "shadows": self.shadows,
+                "shapes": [strings[idx] for idx in shapeTable],
+                "styles": [[strings[idx] for idx in style] for style in styleTable],
+                "images": [imageString(strings[idx]) for idx in imageTable]}
+
+    ItemJsonText = ('{"position": [%r, %r], "background": %s, "foreground": %s, "image": %s, "imageAspectRatio": %d, "control": %s, "label": %s, '
+                    '"font": %s, "script": %s, "flat": %s, "flipped": [%s, %s], "rotated": %s, "scale": [%r, %r], "group": %s, "svgpath": %s}')
+
+    def toJsonText(self): # same text as json.dumps(self.toJson()) without item dicts, each distinct string is encoded once
+        encoded = [json.dumps(imageString(s)) for s in self.strings]
+        column = lambda field: map(encoded.__getitem__, self.stringFields[field])
+
+        names = ["false", "true"]
+        flagValues = [(names[bool(f & PickerDocument.FlatFlag)], names[bool(f & PickerDocument.FlipXFlag)], names[bool(f & PickerDocument.FlipYFlag)], names[bool(f & PickerDocument.RotatedFlag)]) for f in range(16)]
+        positions = self.positions
+        scales = self.scales
+
+        items = [PickerDocument.ItemJsonText % (positions[i*2], positions[i*2+1], background, foreground, image, imageAspectRatio, control, label, font, script,
+                                                flags[0], flags[1], flags[2], flags[3], scales[i*2], scales[i*2+1], group, svgpath)
+                 for i, (background, foreground, image, imageAspectRatio, control, label, font, script, flags, group, svgpath)
+                 in enumerate(zip(column("background"), column("foreground"), column("image"), self.imageAspectRatios, column("control"), column("label"),
+                                  column("font"), column("script"), map(flagValues.__getitem__, self.flags), column("group"), column("svgpath")))]
+
+        return '{"name": %s, "items": [%s], "size": %s, "scale": %s, "shadows": %s}' % (json.dumps(self.name), ", ".join(items), json.dumps(self.size),
+                                                                                       json.dumps(self.scale), json.dumps(self.shadows))
+
+    def fromJson(self, data):
+        picker = Picker()
+        picker.fromJson(data)
+        self.__init__(picker.name)
+        self.size = picker.size
+        self.scale = picker.scale
+        self.shadows = picker.shadows
+        for item in picker.items:
+            self.appendItem(item)
+
+# binary picker: header, json meta, string table, item columns and deduplicated image blobs, little endian
+BinaryPickerMagic = b"PICKERB\0"
+BinaryPickerVersion = 1
+BinaryPickerExtension = ".pickerb"
+BinaryPickerHeader = struct.Struct("<8sHHIIII5Q") # magic, version, reserved, items, strings, blobs, reserved, meta offset, meta size, strings offset, columns offset, blobs offset
+BinaryPickerBlob = struct.Struct("<IIQQ") # string index, reserved, offset, size
+
+# ints and floats are different in json, keep them to make round trips lossless
+IntPositionXFlag = 1
+IntPositionYFlag = 2
+IntScaleXFlag = 4
+IntScaleYFlag = 8
+
+def imageString(image): # images from binary pickers are kept as raw bytes until they are written as json
+    return base64.b64encode(image).decode("ascii") if isinstance(image, bytes) else image
+
+def imageBlob(image): # raw JPEG/PNG bytes of a base64 image, None for paths and texts that don't come back the same
+    if isinstance(image, bytes):
+        return image
+
+    if not image.startswith("/9j/") and not image.startswith("iVBORw0KGgo"):
+        return None
+
+    try:
+        blob = base64.b64decode(image, validate=True)
+    except ValueError:
+        return None
+
+    return blob if base64.b64encode(blob).decode("ascii") == image else None
+
+def arrayBytes(values): # little endian bytes of an array
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def readArray(typecode, data, offset, count):
+    values = array(typecode)
+    values.frombytes(data[offset:offset + values.itemsize * count])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+def savePickerBinary(picker, path):
+    doc = PickerDocument.fromPicker(picker)
+
+    numberFlags = array("B", [(IntPositionXFlag if isinstance(item.position[0], int) else 0) |
+                              (IntPositionYFlag if isinstance(item.position[1], int) else 0) |
+                              (IntScaleXFlag if isinstance(item.scale[0], int) else 0) |
+                              (IntScaleYFlag if isinstance(item.scale[1], int) else 0) for item in picker.items])
+
+    # images go to the blob section, equal images are already a single string
+    strings = doc.strings[:]
+    blobs = []
+    for idx in sorted(set(doc.stringFields["image"])):
+        blob = imageBlob(strings[idx])
+        if blob is not None:
+            blobs.append((idx, blob))
+            strings[idx] = ""
+
+    meta = json.dumps({"name": doc.name, "size": doc.size, "scale": doc.scale, "shadows": doc.shadows}).encode("utf8")
+
+    encodedStrings = [s.encode("utf8") for s in strings]
+    stringOffsets = array("I", [0])
+    for s in encodedStrings:
+        stringOffsets.append(stringOffsets[-1] + len(s))
+    stringsSection = arrayBytes(stringOffsets) + b"".join(encodedStrings)
+
+    columns = [doc.positions, doc.scales, doc.flags, doc.imageAspectRatios, numberFlags] + [doc.stringFields[field] for field in PickerDocument.StringFields]
+    columnsSection = b"".join(arrayBytes(column) for column in columns)
+
+    metaOffset = BinaryPickerHeader.size
+    stringsOffset = metaOffset + len(meta)
+    columnsOffset = stringsOffset + len(stringsSection)
+    blobsOffset = columnsOffset + len(columnsSection)
+
+    blobTable = []
+    blobOffset = blobsOffset + BinaryPickerBlob.size * len(blobs)
+    for idx, blob in blobs:
+        blobTable.append(BinaryPickerBlob.pack(idx, 0, blobOffset, len(blob)))
+        blobOffset += len(blob)
+
+    header = BinaryPickerHeader.pack(BinaryPickerMagic, BinaryPickerVersion, 0, len(doc), len(strings), len(blobs), 0,
+                                     metaOffset, len(meta), stringsOffset, columnsOffset, blobsOffset)
+
+    with open(path, "wb") as f:
+        for chunk in [header, meta, stringsSection, columnsSection] + blobTable + [blob for _, blob in blobs]:
+            f.write(chunk)
+
+def readPickerBinary(data): # bytes or mmap
+    if len(data) < BinaryPickerHeader.size or data[:len(BinaryPickerMagic)] != BinaryPickerMagic:
+        raise ValueError("Not a binary picker")
+
+    (_, version, _, itemCount, stringCount, blobCount, _,
+     metaOffset, metaSize, stringsOffset, columnsOffset, blobsOffset) = BinaryPickerHeader.unpack_from(data, 0)
+
+    if version > BinaryPickerVersion:
+        raise ValueError("Unsupported binary picker version %d"%version)
+
+    meta = json.loads(data[metaOffset:metaOffset+metaSize].decode("utf8"))
+
+    stringOffsets = readArray("I", data, stringsOffset, stringCount+1)
+    stringsBase = stringsOffset + stringOffsets.itemsize * (stringCount+1)
+    strings = [data[stringsBase+stringOffsets[i]:stringsBase+stringOffsets[i+1]].decode("utf8") for i in range(stringCount)]
+
+    # images stay raw JPEG/PNG bytes, they are decoded by the image cache when items are drawn
+    for i in range(blobCount):
+        idx, _, offset, size = BinaryPickerBlob.unpack_from(data, blobsOffset + i * BinaryPickerBlob.size)
+        strings[idx] = bytes(data[offset:offset+size])
+
+    doc = PickerDocument(meta["name"])
+    doc.size = meta["size"]
+    doc.scale = meta["scale"]
+    doc.shadows = meta["shadows"]
+
+    offset = columnsOffset
+    columns = []
+    for typecode, count in [("d", itemCount*2), ("d", itemCount*2), ("B", itemCount), ("B", itemCount), ("B", itemCount)] + [("I", itemCount)] * len(PickerDocument.StringFields):
+        column = readArray(typecode, data, offset, count)
+        columns.append(column)
+        offset += column.itemsize * count
+
+    doc.positions, doc.scales, doc.flags, doc.imageAspectRatios, numberFlags = columns[:5]
+    doc.stringFields = dict(zip(PickerDocument.StringFields, columns[5:]))
+    doc.strings = strings
+    doc._stringIndices = {s: i for i, s in enumerate(strings)}
+
+    picker = doc.toPicker()
+    for item, flags in zip(picker.items, numberFlags):
+        if flags:
+            item.position = [int(v) if flags & f else v for v, f in zip(item.position, (IntPositionXFlag, IntPositionYFlag))]
+            item.scale = [int(v) if flags & f else v for v, f in zip(item.scale, (IntScaleXFlag, IntScaleYFlag))]
+    return picker
+
+def loadPickerBinary(path): # the file is memory mapped, only the needed parts are read
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return readPickerBinary(data)
+
+def isBinaryPickerFile(path):
+    with open(path, "rb") as f:
+        return f.read(len(BinaryPickerMagic)) == BinaryPickerMagic
+
+def loadPickerFile(path): # json or binary picker
+    if isBinaryPickerFile(path):
+        return loadPickerBinary(path)
+
+    picker = Picker()
+    with open(path, "r") as f:
+        picker.fromJson(json.load(f))
+    return picker
+
+def savePickerFile(picker, path, sharedTables=False): # binary for BinaryPickerExtension files, json otherwise
+    # json with shared tables is smaller, but older picker versions can't read it
+    if path.lower().endswith(BinaryPickerExtension):
+        savePickerBinary(picker, path)
+    else:
+        with open(path, "w") as f:
+            json.dump(picker.toJson(sharedTables=sharedTables), f, indent=4)
+
+def convertPickerFile(inputPath, outputPath, sharedTables=False): # json <-> binary, the format is chosen by the output extension
+    savePickerFile(loadPickerFile(inputPath), outputPath, sharedTables)
+
+NodePayloadMarker = "PICKERZ" # compressed picker data in node attributes: marker, version, base64 of zlib compressed json
+NodePayloadVersion = 1
+NodePayloadLevel = 6
+NodePayloadStats = {"rawBytes": 0, "storedBytes": 0, "writtenAttributes": 0, "encodeMs": 0.0, "decodeMs": 0.0}
+
+NodeIndexDecodeSize = 4096 # stored payloads shorter than this are cheap to decode in the main thread
+NodeChunkSize = 64 # items per chunk attribute, items are grouped by their stable ids
+
+def packNodePayload(raw): # bytes to the string stored in a node attribute
+    return "%s%d:%s" % (NodePayloadMarker, NodePayloadVersion, base64.b64encode(zlib.compress(raw, NodePayloadLevel)).decode("ascii"))
+
+def unpackNodePayload(payload): # compressed or plain json (pickers saved by older versions) to bytes
+    if payload.startswith(NodePayloadMarker):
+        header, _, body = payload.partition(":")
+        version = int(header[len(NodePayloadMarker):])
+        if version > NodePayloadVersion:
+            raise ValueError("Picker data version %d is newer than supported %d" % (version, NodePayloadVersion))
+        return zlib.decompress(base64.b64decode(body))
+    return payload.encode("utf8")
+
+def encodeNodePayload(document): # picker document to the string stored in a node attribute
+    startTime = time.perf_counter()
+    raw = document.toJsonText().encode("utf8")
+    payload = packNodePayload(raw)
+
+    NodePayloadStats.update(rawBytes=len(raw), storedBytes=len(payload), writtenAttributes=1, encodeMs=(time.perf_counter() - startTime) * 1000)
+    return payload
+
+def nodeChunkAttribute(attribute, chunk):
+    return "pickerChunk_%s_%d" % (attribute, chunk)
+
+def nodeImageAttribute(attribute, key):
+    return "pickerImage_%s_%s" % (attribute, key)
+
+def payloadDigest(raw):
+    return hashlib.sha1(raw).hexdigest()
+
+def encodePickerNode(document, ids, attribute, digests, chunked=True):
+    # returns {attribute: payload} to write and {attribute: digest} of all picker attributes,
+    # in chunked layout only attributes with changed digests are written
+    if not chunked: # whole picker in one attribute, always written, readable by older versions
+        return {attribute: encodeNodePayload(document)}, {attribute: None}
+
+    startTime = time.perf_counter()
+
+    newDigests = {}
+    writes = {}
+    rawBytes = 0
+
+    chunks = OrderedDict() # {chunk: [item index]}
+    for i, uid in enumerate(ids):
+        chunks.setdefault(uid // NodeChunkSize, []).append(i)
+
+    imageKeys = {"": ""}
+    for chunk, indices in chunks.items():
+        tables = PickerTables()
+        items = [tables.shareItem(document.item(i).toJson()) for i in indices]
+
+        for image in tables.images: # images are kept in their own attributes, named by content
+            if image not in imageKeys:
+                imageKeys[image] = key = payloadDigest(image.encode("utf8"))
+                imageAttribute = nodeImageAttribute(attribute, key)
+                newDigests[imageAttribute] = key
+                if digests.get(imageAttribute) != key:
+                    writes[imageAttribute] = packNodePayload(image.encode("utf8"))
+                    rawBytes += len(image)
+
+        data = tables.toJson()
+        data["images"] = [imageKeys[image] for image in tables.images]
+        data["ids"] = [ids[i] for i in indices]
+        data["items"] = items
+        raw = json.dumps(data).encode("utf8")
+
+        chunkAttribute = nodeChunkAttribute(attribute, chunk)
+        newDigests[chunkAttribute] = payloadDigest(raw)
+        if digests.get(chunkAttribute) != newDigests[chunkAttribute]:
+            writes[chunkAttribute] = packNodePayload(raw)
+            rawBytes += len(raw)
+
+    index = {"name": document.name, "size": document.size, "scale": document.scale, "shadows": document.shadows,
+             "order": ids, "chunks": list(chunks.keys())}
+    raw = json.dumps(index).encode("utf8")
+    newDigests[attribute] = payloadDigest(raw)
+    if digests.get(attribute) != newDigests[attribute]:
+        writes[attribute] = packNodePayload(raw)
+        rawBytes += len(raw)
+
+    NodePayloadStats.update(rawBytes=rawBytes, storedBytes=sum(len(payload) for payload in writes.values()), writtenAttributes=len(writes),
+                            encodeMs=(time.perf_counter() - startTime) * 1000)
+    return writes, newDigests
+
+def readPickerNode(node, attribute): # {attribute: payload} of a picker, node is read in the main thread
+    payloads = {attribute: node.attr(attribute).get()}
+    for pattern in ["pickerChunk_%s_*", "pickerImage_%s_*"]:
+        for attr in node.listAttr(ud=True, st=pattern % attribute):
+            payloads[attr.longName()] = attr.get()
+    return payloads
+
+def decodeNodeIndex(payload): # chunk index or the whole picker in older layouts
+    return json.loads(unpackNodePayload(payload))
+
+def nodeIndexItemCount(data):
+    return len(data["order"]) if "chunks" in data else len(data["items"])
+
+def decodePickerNode(payloads, attribute): # returns picker, stable item ids and digests of picker attributes
+    startTime = time.perf_counter()
+
+    raw = unpackNodePayload(payloads[attribute])
+    data = json.loads(raw)
+
+    picker = Picker()
+    digests = {attribute: payloadDigest(raw)}
+    rawBytes = len(raw)
+    storedBytes = len(payloads[attribute])
+
+    if "chunks" not in data: # whole picker in one attribute
+        picker.fromJson(data)
+        ids = []
+
+    else:
+        picker.name = data["name"]
+        picker.size = data["size"]
+        picker.scale = data["scale"]
+        picker.shadows = data["shadows"]
+        ids = data["order"]
+
+        images = {"": ""}
+        items = {}
+        for chunk in data["chunks"]:
+            chunkAttribute = nodeChunkAttribute(attribute, chunk)
+            payload = payloads[chunkAttribute]
+            raw = unpackNodePayload(payload)
+            chunkData = json.loads(raw)
+            digests[chunkAttribute] = payloadDigest(raw)
+            rawBytes += len(raw)
+            storedBytes += len(payload)
+
+            for key in chunkData["images"]:
+                if key not in images:
+                    imageAttribute = nodeImageAttribute(attribute, key)
+                    payload = payloads[imageAttribute]
+                    images[key] = unpackNodePayload(payload).decode("utf8")
+                    digests[imageAttribute] = key
+                    rawBytes += len(images[key])
+                    storedBytes += len(payload)
+
+            chunkData["images"] = [images[key] for key in chunkData["images"]]
+            tables = PickerTables.fromJson(chunkData)
+            for uid, d in zip(chunkData["ids"], chunkData["items"]):
+                item = PickerItem()
+                item.fromJson(d, tables)
+                items[uid] = item
+
+        picker.items = [items[uid] for uid in ids] # original order
+
+    NodePayloadStats.update(rawBytes=rawBytes, storedBytes=storedBytes, decodeMs=(time.perf_counter() - startTime) * 1000)
+    return picker, ids, digests
+
+def nodePayloadStats():
+    stats = dict(NodePayloadStats)
+    stats["ratio"] = stats["rawBytes"] / float(stats["storedBytes"]) if stats["storedBytes"] else 1.0
+    return stats
+
 def findSymmetricName(name, left=True, right=True):
     L_starts = {"L_": "R_", "l_": "r_", "Left":"Right", "left_": "right_"}
     L_ends = {"_L": "_R", "_l": "_r", "Left": "Right", "_left":"_right"}
@@ -197,13 +804,173 @@ def pixmap2str(pixmap):
     buf.open(QIODevice.WriteOnly)
     pixmap.save(buf, "JPG", 100)
     buf.close()
-    return base64.b64encode(ba.data())
+    return base64.b64encode(ba.data()).decode("utf8")
 
 def str2pixmap(pixmapStr):
     pixmap = QPixmap()
-    pixmap.loadFromData(base64.b64decode(pixmapStr))
+    pixmap.loadFromData(pixmapStr if isinstance(pixmapStr, bytes) else base64.b64decode(pixmapStr))
     return pixmap
 
+def imageBytes(image): # QImage or QPixmap
+    return image.width() * image.height() * image.depth() // 8
+
+class ImageCache(object):
+    MipmapMinSize = 32
+    MipmapMaxSize = 4096
+
+    def __init__(self, maxBytes=256*1024*1024):
+        self.maxBytes = maxBytes
+        self.hits = 0 # of mipmaps, source images are looked up only to create them
+        self.misses = 0
+        self._images = OrderedDict() # {key: QImage}
+        self._mipmaps = OrderedDict() # {key: ImageMipmaps}
+        self._bytes = 0
+
+    @staticmethod
+    def contentKey(data):
+        return hashlib.sha1(data.encode("utf8") if isinstance(data, str) else data).hexdigest()
+
+    def image(self, key, loadFunc): # decoded source image
+        image = self._images.get(key)
+        if image is None:
+            image = loadFunc()
+            self.addImage(key, image)
+        else:
+            self._images.move_to_end(key)
+        return image
+
+    def addImage(self, key, image): # decoded somewhere else, i.e. in LoadThreadPool
+        if key in self._images or self._mipmaps.get(key): # not needed when mipmaps are there
+            return
+
+        self._images[key] = image
+        self._bytes += imageBytes(image)
+        self.evict()
+
+    def mipmaps(self, key, loadFunc): # ImageMipmaps of the image, None when it can't be loaded
+        mipmaps = self._mipmaps.get(key)
+        if mipmaps is None:
+            self.misses += 1
+            image = self.image(key, loadFunc)
+
+            mipmaps = ImageMipmaps(self, key, loadFunc, image.size()) if not image.isNull() else None
+            self._mipmaps[key] = mipmaps
+        else:
+            self.hits += 1
+            self._mipmaps.move_to_end(key)
+        return mipmaps
+
+    def mipmapCreated(self, mipmaps, pixmap): # the source image isn't kept once a level is created from it
+        if self._mipmaps.get(mipmaps.key) is mipmaps: # evicted pyramids are still drawn by their items
+            self._bytes += imageBytes(pixmap)
+        self.releaseImage(mipmaps.key)
+        self.evict()
+
+    def releaseImage(self, key):
+        image = self._images.pop(key, None)
+        if image is not None:
+            self._bytes -= imageBytes(image)
+
+    def evict(self): # remove least recently used decoded images first, they are only needed to build mipmaps
+        while self._bytes > self.maxBytes and self._images:
+            _, image = self._images.popitem(last=False)
+            self._bytes -= imageBytes(image)
+
+        while self._bytes > self.maxBytes and self._mipmaps:
+            _, mipmaps = self._mipmaps.popitem(last=False)
+            if mipmaps:
+                self._bytes -= mipmaps.bytes()
+
+    def setMaxBytes(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.evict()
+
+    def clear(self):
+        self._images.clear()
+        self._mipmaps.clear()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {"images": len(self._images), "mipmaps": len(self._mipmaps), "bytes": self._bytes, "maxBytes": self.maxBytes, "hits": self.hits, "misses": self.misses}
+
+class ImageMipmaps(object): # levels halved down from the source size, each level is created when it's drawn first
+    def __init__(self, cache, key, loadFunc, size):
+        self.cache = cache
+        self.key = key
+        self.loadFunc = loadFunc
+
+        if max(size.width(), size.height()) > ImageCache.MipmapMaxSize:
+            size = size.scaled(ImageCache.MipmapMaxSize, ImageCache.MipmapMaxSize, Qt.KeepAspectRatio)
+
+        self.sizes = [size]
+        while max(size.width(), size.height()) > ImageCache.MipmapMinSize:
+            size = QSize(max(1, size.width()//2), max(1, size.height()//2))
+            self.sizes.append(size)
+
+        self.pixmaps = [None] * len(self.sizes)
+
+    def size(self):
+        return self.sizes[0]
+
+    def bytes(self):
+        return sum([imageBytes(pixmap) for pixmap in self.pixmaps if pixmap is not None])
+
+    def pixmapForWidth(self, width): # smallest level that is still not magnified
+        level = 0
+        for i in range(len(self.sizes)-1, -1, -1):
+            if self.sizes[i].width() >= width:
+                level = i
+                break
+        return self.pixmap(level)
+
+    def pixmap(self, level):
+        pixmap = self.pixmaps[level]
+        if pixmap is None:
+            image = self.cache.image(self.key, self.loadFunc) # decoded again when the source is released
+            pixmap = QPixmap.fromImage(image.scaled(self.sizes[level], Qt.IgnoreAspectRatio, Qt.SmoothTransformation))
+            self.pixmaps[level] = pixmap
+            self.cache.mipmapCreated(self, pixmap)
+        return pixmap
+
+ImageCacheInstance = ImageCache()
+
+def cachedImageSourceKey(image): # embedded images are hashed once, not for every item
+    if isinstance(image, bytes) or image.startswith("/9j/"):
+        key = ImageKeyCache.get(image)
+        if key is None:
+            key = imageSourceKey(image)
+            ImageKeyCache.set(image, key)
+        return key
+    return imageSourceKey(image) # file can be changed
+
+def imageSourceKey(image): # content key in the image cache, None when there is no image
+    if isinstance(image, bytes) or image.startswith("/9j/"): # image bytes
+        return ImageCache.contentKey(image)
+    elif image:
+        imagePath = os.path.expandvars(image)
+        if os.path.exists(imagePath):
+            return (imagePath, os.path.getmtime(imagePath))
+
+def loadImageSource(image): # QImage can be decoded in any thread
+    if isinstance(image, bytes):
+        return QImage.fromData(image)
+    elif image.startswith("/9j/"):
+        return QImage.fromData(base64.b64decode(image))
+    return QImage(os.path.expandvars(image))
+
+def imageSourceSize(image): # size from the image header without decoding it, invalid when it can't be read
+    if isinstance(image, bytes) or image.startswith("/9j/"):
+        buffer = QBuffer()
+        buffer.setData(QByteArray(image if isinstance(image, bytes) else base64.b64decode(image)))
+        return QImageReader(buffer).size()
+    return QImageReader(os.path.expandvars(image)).size()
+
+def decodeImageSource(image): # cache key and decoded image, run in LoadThreadPool
+    key = imageSourceKey(image)
+    return key, loadImageSource(image) if key else None
+
 def mayaVisibilityCallback(attr, item_ref, hierarchy):
     # Получить объект из weak reference
     item = item_ref() if isinstance(item_ref, weakref.ref) else item_ref
@@ -277,40 +1044,89 @@ def enlargeRect(rect, offset):
     rect.setBottomRight(rect.bottomRight() + offsetPoint)
     return rect
 
+class LRUCache(object):
+    def __init__(self, maxSize=1024):
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxSize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {"size": len(self._data), "maxSize": self.maxSize, "hits": self.hits, "misses": self.misses}
+
+ParsedPathCache = LRUCache(512) # svgpath: [(cmd, numbers), ...]
+PainterPathCache = LRUCache(4096) # (svgpath, scaleX, scaleY, flipX, flipY, rotate): QPainterPath
+ImageKeyCache = LRUCache(256) # embedded image: content key, main thread only
+
+def clearPathCache():
+    ParsedPathCache.clear()
+    PainterPathCache.clear()
+
+def pathCacheStats():
+    return {"parsed": ParsedPathCache.stats(), "painterPath": PainterPathCache.stats()}
+
+def parsePathCached(path):
+    commands = ParsedPathCache.get(path)
+    if commands is None:
+        commands = tuple(parsePath(path)) # immutable, shared between callers
+        ParsedPathCache.set(path, commands)
+    return commands
+
+PathTokenRegexp = re.compile(r"([MmLlHhVvCcSsQqTtAaZz])|([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)")
+PathCommandSize = {"M":2, "m":2, "L":2, "l":2, "H":1, "h":1, "V":1, "v":1, "C":6, "c":6,
+                   "S":4, "s":4, "Q":4, "q":4, "T":2, "t":2, "A":7, "a":7, "Z":0, "z":0}
+
 def parsePath(path):
     commands = []
 
-    currentCommand = ""
-    commandNumbers = []
-    currentNumber = ""
-    sign = 1
+    def addCommand(cmd, numbers):
+        size = PathCommandSize[cmd]
+        if size == 0 or len(numbers) <= size:
+            commands.append((cmd, tuple(numbers)))
+            return
 
-    for c in path+" ":
-        if c in ["M", "m", "L", "l", "H", "h", "V", "v", "C", "c", "Q", "q", "A", "a", "Z", "z", "T", "t", "S", "s"]:
-            if currentNumber:
-                commandNumbers.append(float(currentNumber)*sign)
-                sign = 1
-                currentNumber = ""
+        # implicit repeated commands, like "L 0 0 10 10", moveto is followed by lineto
+        for i in range(0, len(numbers) - size + 1, size): # incomplete trailing numbers are ignored
+            commands.append((cmd, tuple(numbers[i:i+size])))
+            if cmd in ["M", "m"]:
+                cmd = "L" if cmd == "M" else "l"
 
+    currentCommand = ""
+    commandNumbers = []
+    for cmd, number in PathTokenRegexp.findall(path):
+        if cmd:
             if currentCommand:
-                commands.append((currentCommand, commandNumbers))
-
+                addCommand(currentCommand, commandNumbers)
+            currentCommand = cmd
             commandNumbers = []
-            currentCommand = c
-            currentNumber = ""
-            sign = 1
-
-        elif c in ["0","1","2","3","4","5","6","7","8","9","."]:
-            currentNumber += c
-
         else:
-            if currentNumber:
-                commandNumbers.append(float(currentNumber)*sign)
-                currentNumber = ""
-
-            sign = -1 if c == "-" else 1
+            commandNumbers.append(float(number))
 
-    commands.append((currentCommand, commandNumbers))
+    if currentCommand:
+        addCommand(currentCommand, commandNumbers)
     return commands
 
 def pathArc(path, rx, ry, x_axis_rotation, large_arc_flag, sweep_flag, x, y, curx, cury):
@@ -405,100 +1221,94 @@ def pathArc(path, rx, ry, x_axis_rotation, large_arc_flag, sweep_flag, x, y, cur
                        rx, ry, x_axis_rotation)
 
 def getPainterPath(path, scaleX=1, scaleY=1, flipX=False, flipY=False, rotate=False):
-    # translated from https://code.qt.io/cgit/qt/qtsvg.git/tree/src/svg/qsvghandler.cpp
+    key = (path, scaleX, scaleY, flipX, flipY, rotate)
+    painterPath = PainterPathCache.get(key)
+    if painterPath is None:
+        painterPath = getUnitPainterPath(path)
 
-    scaledPointF = lambda p: QPointF(p.x()*scaleX, p.y()*scaleY)
+        if scaleX != 1 or scaleY != 1 or flipX or flipY or rotate:
+            transform = QTransform(0, 1, 1, 0, 0, 0) if rotate else QTransform() # rotation swaps x and y
+            transform *= QTransform.fromScale(-scaleX if flipX else scaleX, -scaleY if flipY else scaleY)
 
-    painterPath = QPainterPath()
+            painterPath = transform.map(painterPath)
+            rect = painterPath.boundingRect()
+            painterPath.translate(-rect.x(), -rect.y())
+            painterPath.setFillRule(Qt.WindingFill)
 
-    data = parsePath(path)
+        PainterPathCache.set(key, painterPath)
+    return QPainterPath(painterPath) # implicitly shared copy, so callers can't modify the cached one
 
-    if flipX or flipY:
-        tmp = getPainterPath(path, 1, 1, False, False, rotate)
-        rect = tmp.boundingRect()
-        maxX = rect.width()
-        maxY = rect.height()
+def getPainterPathRect(path, scaleX=1, scaleY=1, flipX=False, flipY=False, rotate=False): # bounds of getPainterPath without transforming the path
+    rect = getUnitPainterPath(path).boundingRect()
+
+    if scaleX != 1 or scaleY != 1 or flipX or flipY or rotate: # transformed paths are moved to the origin
+        width, height = (rect.height(), rect.width()) if rotate else (rect.width(), rect.height())
+        rect = QRectF(0, 0, width * abs(scaleX), height * abs(scaleY))
+
+    return rect
+
+def getUnitPainterPath(path): # canonical path without scale, flip and rotation
+    key = (path, 1, 1, False, False, False)
+    painterPath = PainterPathCache.get(key)
+    if painterPath is None:
+        painterPath = buildPainterPath(path)
+        PainterPathCache.set(key, painterPath)
+    return painterPath
+
+def buildPainterPath(path):
+    # translated from https://code.qt.io/cgit/qt/qtsvg.git/tree/src/svg/qsvghandler.cpp
+
+    painterPath = QPainterPath()
 
     x0, y0 = 0, 0 ## starting point
     x, y = 0,0 # current point
     lastMode = ""
     ctrlPt = QPointF()
 
-    for cmd, numbers in data:
-        #cp = painterPath.currentPosition()
+    for cmd, numbers in parsePathCached(path):
         offsetX, offsetY = x, y
 
-        if rotate:
-            cmdInversion = {"h":"v", "H":"V", "v":"h", "V": "H"}
-            cmd = cmdInversion.get(cmd, cmd)
-
-            if cmd not in ["h", "H", "v", "V"]:
-                newNumbers = [0]*len(numbers)
-                for i in range(0, len(numbers), 2):
-                    newNumbers[i] = numbers[i+1]
-                    newNumbers[i+1] = numbers[i]
-                numbers = newNumbers
-
-        if flipX or flipY:
-            for i in range(len(numbers)):
-                if flipX and cmd == "H":
-                    numbers[i] = maxX-numbers[i]
-                if flipX and cmd == "h":
-                    numbers[i] *= -1
-                elif flipY and cmd == "V":
-                    numbers[i] = maxY-numbers[i]
-                elif flipY and cmd == "v":
-                    numbers[i] *= -1
-                elif cmd in ["M", "m", "L", "l", "C", "c", "Q", "q", "T", "t", "S", "s"]:
-                    if flipX and i%2==0: # x
-                        numbers[i] = maxX-numbers[i]
-                    if flipY and i%2!=0: # y
-                        numbers[i] = maxY-numbers[i]
-                elif cmd == "A":
-                    if flipX: numbers[5] = maxX-numbers[5]
-                    if flipY: numbers[6] = maxY-numbers[6]
-
         if cmd == "M":
             x = x0 = numbers[0]
             y = y0 = numbers[1]
-            painterPath.moveTo(x0*scaleX, y0*scaleY)
+            painterPath.moveTo(x0, y0)
 
         elif cmd == "m":
             x = x0 = numbers[0] + offsetX
             y = y0 = numbers[1] + offsetY
-            painterPath.moveTo(x0*scaleX, y0*scaleY)
+            painterPath.moveTo(x0, y0)
 
         elif cmd == "L":
             x = numbers[0]
             y = numbers[1]
-            painterPath.lineTo(x*scaleX, y*scaleY)
+            painterPath.lineTo(x, y)
 
         elif cmd == "l":
             x = numbers[0] + offsetX
             y = numbers[1] + offsetY
-            painterPath.lineTo(x*scaleX, y*scaleY)
+            painterPath.lineTo(x, y)
 
         elif cmd == "H":
             x = numbers[0]
-            painterPath.lineTo(x*scaleX, y*scaleY)
+            painterPath.lineTo(x, y)
 
         elif cmd == "h":
             x = numbers[0] + offsetX
-            painterPath.lineTo(x*scaleX, y*scaleY)
+            painterPath.lineTo(x, y)
 
         elif cmd == "V":
             y = numbers[0]
-            painterPath.lineTo(x*scaleX, y*scaleY)
+            painterPath.lineTo(x, y)
 
         elif cmd == "v":
             y = numbers[0] + offsetY
-            painterPath.lineTo(x*scaleX, y*scaleY)
+            painterPath.lineTo(x, y)
 
         elif cmd == "C":
             c1 = QPointF(numbers[0], numbers[1])
             c2 = QPointF(numbers[2], numbers[3])
             e = QPointF(numbers[4], numbers[5])
-            painterPath.cubicTo(scaledPointF(c1), scaledPointF(c2), scaledPointF(e))
+            painterPath.cubicTo(c1, c2, e)
             ctrlPt = c2
             x = e.x()
             y = e.y()
@@ -507,7 +1317,7 @@ def getPainterPath(path, scaleX=1, scaleY=1, flipX=False, flipY=False, rotate=Fa
             c1 = QPointF(numbers[0] + offsetX, numbers[1] + offsetY)
             c2 = QPointF(numbers[2] + offsetX, numbers[3] + offsetY)
             e = QPointF(numbers[4] + offsetX, numbers[5] + offsetY)
-            painterPath.cubicTo(scaledPointF(c1), scaledPointF(c2), scaledPointF(e))
+            painterPath.cubicTo(c1, c2, e)
             ctrlPt = c2
             x = e.x()
             y = e.y()
@@ -516,7 +1326,7 @@ def getPainterPath(path, scaleX=1, scaleY=1, flipX=False, flipY=False, rotate=Fa
             c1 = QPointF(2*x-ctrlPt.x(), 2*y-ctrlPt.y()) if lastMode in ["C", "c", "S", "s"] else QPointF(x, y)
             c2 = QPointF(numbers[0], numbers[1])
             e = QPointF(numbers[2], numbers[3])
-            path.cubicTo(scaledPointF(c1), scaledPointF(c2), scaledPointF(e))
+            painterPath.cubicTo(c1, c2, e)
             ctrlPt = c2
             x = e.x()
             y = e.y()
@@ -525,7 +1335,7 @@ def getPainterPath(path, scaleX=1, scaleY=1, flipX=False, flipY=False, rotate=Fa
             c1 = QPointF(2*x-ctrlPt.x(), 2*y-ctrlPt.y()) if lastMode in ["C", "c", "S", "s"] else QPointF(x, y)
             c2 = QPointF(numbers[0] + offsetX, numbers[1] + offsetY)
             e = QPointF(numbers[2] + offsetX, numbers[3] + offsetY)
-            path.cubicTo(scaledPointF(c1), scaledPointF(c2), scaledPointF(e))
+            painterPath.cubicTo(c1, c2, e)
             ctrlPt = c2
             x = e.x()
             y = e.y()
@@ -533,7 +1343,7 @@ def getPainterPath(path, scaleX=1, scaleY=1, flipX=False, flipY=False, rotate=Fa
         elif cmd == "Q":
             c = QPointF(numbers[0], numbers[1])
             e = QPointF(numbers[2], numbers[3])
-            painterPath.quadTo(scaledPointF(c), scaledPointF(e))
+            painterPath.quadTo(c, e)
             ctrlPt = c
             x = e.x()
             y = e.y()
@@ -541,7 +1351,7 @@ def getPainterPath(path, scaleX=1, scaleY=1, flipX=False, flipY=False, rotate=Fa
         elif cmd == "q":
             c = QPointF(numbers[0] + offsetX, numbers[1] + offsetY)
             e = QPointF(numbers[2] + offsetX, numbers[3] + offsetY)
-            painterPath.quadTo(scaledPointF(c), scaledPointF(e))
+            painterPath.quadTo(c, e)
             ctrlPt = c
             x = e.x()
             y = e.y()
@@ -554,7 +1364,7 @@ def getPainterPath(path, scaleX=1, scaleY=1, flipX=False, flipY=False, rotate=Fa
         elif cmd == "T":
             e = QPointF(numbers[0], numbers[1])
             c = QPointF(2*x-ctrlPt.x(), 2*y-ctrlPt.y()) if lastMode in ["Q", "q", "T", "t"] else QPointF(x, y)
-            painterPath.quadTo(scaledPointF(c), scaledPointF(e))
+            painterPath.quadTo(c, e)
             ctrlPt = c
             x = e.x()
             y = e.y()
@@ -562,16 +1372,14 @@ def getPainterPath(path, scaleX=1, scaleY=1, flipX=False, flipY=False, rotate=Fa
         elif cmd == "t":
             e = QPointF(numbers[0] + offsetX, numbers[1] + offsetY)
             c = QPointF(2*x-ctrlPt.x(), 2*y-ctrlPt.y()) if lastMode in ["Q", "q", "T", "t"] else QPointF(x, y)
-            painterPath.quadTo(scaledPointF(c), scaledPointF(e))
+            painterPath.quadTo(c, e)
             ctrlPt = c
             x = e.x()
             y = e.y()
 
         elif cmd == "A":
             rx, ry, xAxisRotation, largeArcFlag, sweepFlag, ex, ey = numbers
-            curx = x
-            cury = y
-            pathArc(painterPath, rx, ry, xAxisRotation, int(largeArcFlag), int(sweepFlag), ex*scaleX, ey*scaleY, curx*scaleX, cury*scaleY)
+            pathArc(painterPath, rx, ry, xAxisRotation, int(largeArcFlag), int(sweepFlag), ex, ey, x, y)
             x = ex
             y = ey
 
@@ -579,9 +1387,7 @@ def getPainterPath(path, scaleX=1, scaleY=1, flipX=False, flipY=False, rotate=Fa
             rx, ry, xAxisRotation, largeArcFlag, sweepFlag, ex, ey = numbers
             ex += offsetX
             ey += offsetY
-            curx = x
-            cury = y
-            pathArc(painterPath, rx, ry, xAxisRotation, int(largeArcFlag), int(sweepFlag), ex*scaleX, ey*scaleY, curx*scaleX, cury*scaleY)
+            pathArc(painterPath, rx, ry, xAxisRotation, int(largeArcFlag), int(sweepFlag), ex, ey, x, y)
             x = ex
             y = ey
 
@@ -649,7 +1455,34 @@ class ScaleAnchorItem(QGraphicsItem):
         self.isDragging = False
 
 class SceneItem(QGraphicsItem):
-    ShadowOffset = 5
+    ShadowOffset = 2
+    ShadowColor = QColor(63, 63, 63, 180)
+    RenderCacheSize = 8 # rendered states kept per item
+    RenderCacheMaxPixmapSize = 2048
+
+    # what updateShape recomputes, geometry changes imply label and image updates
+    DirtyNothing = 0
+    DirtyPaint = 1
+    DirtyLabel = 2
+    DirtyImage = 4
+    DirtyGeometry = 8
+    DirtyAll = DirtyPaint | DirtyLabel | DirtyImage | DirtyGeometry
+
+    PropertyDirtyFlags = {"position": DirtyNothing,
+                          "svgpath": DirtyGeometry,
+                          "scale": DirtyGeometry,
+                          "flipped": DirtyGeometry,
+                          "rotated": DirtyGeometry,
+                          "image": DirtyImage,
+                          "imageAspectRatio": DirtyImage,
+                          "label": DirtyLabel,
+                          "font": DirtyLabel,
+                          "background": DirtyPaint,
+                          "foreground": DirtyPaint,
+                          "flat": DirtyPaint,
+                          "control": DirtyNothing,
+                          "group": DirtyNothing,
+                          "script": DirtyNothing}
 
     def __init__(self, pickerItem, **kwargs):
         super(SceneItem, self).__init__(**kwargs)
@@ -658,7 +1491,13 @@ class SceneItem(QGraphicsItem):
         self.isMayaControlInvalid = False
 
         self.pickerItem = pickerItem
-        self.imagePixmap = None
+        self.imageMipmaps = None
+        self.imageRect = QRectF()
+        self._imageSource = None
+        self._imageKey = None
+        self._renderCache = {} # {(state, deviceScale): QPixmap}
+        self._labelLayout = None # (font, staticText, position)
+        self._boundingRect = QRectF()
 
         self.painterPath = getPainterPath(pickerItem.svgpath)
 
@@ -667,6 +1506,8 @@ class SceneItem(QGraphicsItem):
         self.scaleAnchorItem.setParentItem(self)
 
         self.isHover = False
+        self.hasShadow = True
+        self.virtualItem = None # VirtualItem the item is created for
 
         self._isDragging = False
         self._startPos = None
@@ -677,44 +1518,71 @@ class SceneItem(QGraphicsItem):
 
         self.updateScaleAnchor()
 
-        shadowEffect = QGraphicsDropShadowEffect()
-        shadowEffect.setOffset(2)
-        self.setGraphicsEffect(shadowEffect)
-
         self.setUnitScale(QVector2D(self.pickerItem.scale[0],self.pickerItem.scale[1]))
 
     def copy(self, other):
         self.pickerItem.copy(other.pickerItem)
         self.updateShape()
 
+        if self.scene():
+            self.scene().updateItemIndex(self)
+
     def unitScale(self):
         return QVector2D(self.pickerItem.scale[0], self.pickerItem.scale[1])
 
-    def updateShape(self):
-        scaleX = self.pickerItem.scale[0] / 25 + 1
-        scaleY = self.pickerItem.scale[1] / 25 + 1
+    def updateShape(self, dirty=DirtyAll): # dirty is a combination of Dirty* flags
+        if dirty & SceneItem.DirtyGeometry:
+            dirty |= SceneItem.DirtyLabel | SceneItem.DirtyImage # both are laid out inside the shape
+
+        if not dirty:
+            return
+
+        self.invalidateRenderCache()
+
+        if not dirty & (SceneItem.DirtyGeometry | SceneItem.DirtyLabel | SceneItem.DirtyImage): # colors only
+            self.update()
+            return
 
         self.prepareGeometryChange()
-        self.painterPath = getPainterPath(self.pickerItem.svgpath, scaleX, scaleY, self.pickerItem.flipped[0], self.pickerItem.flipped[1], self.pickerItem.rotated)
 
-        self.imagePixmap = QPixmap()
+        if dirty & SceneItem.DirtyGeometry:
+            scaleX = self.pickerItem.scale[0] / 25 + 1
+            scaleY = self.pickerItem.scale[1] / 25 + 1
+            self.painterPath = getPainterPath(self.pickerItem.svgpath, scaleX, scaleY, self.pickerItem.flipped[0], self.pickerItem.flipped[1], self.pickerItem.rotated)
 
-        pixmap = None
-        if self.pickerItem.image.startswith("/9j/"): # image bytes
-            pixmap = str2pixmap(self.pickerItem.image)
-        else:
-            imagePath = os.path.expandvars(self.pickerItem.image)
-            if os.path.exists(imagePath):
-                pixmap = QPixmap()
-                pixmap.load(imagePath)
+        if dirty & SceneItem.DirtyLabel:
+            self._labelLayout = None
+            if self.pickerItem.label:
+                self.updateLabelLayout()
 
-        if pixmap:
-            aspectRatio = {0:Qt.IgnoreAspectRatio, 1:Qt.KeepAspectRatio, 2: Qt.KeepAspectRatioByExpanding}
-            boundingRect = self.painterPath.boundingRect()
-            self.imagePixmap = pixmap.scaled(boundingRect.width(), boundingRect.height(), aspectRatio[self.pickerItem.imageAspectRatio], Qt.SmoothTransformation)
-            self.setZValue(-1)
+        if dirty & SceneItem.DirtyImage:
+            self.imageMipmaps = None
+            self.imageRect = QRectF()
 
-        self.updateScaleAnchor()
+            imageKey = self.imageKey()
+            if imageKey:
+                self.imageMipmaps = ImageCacheInstance.mipmaps(imageKey, self.loadImage)
+                if self.imageMipmaps:
+                    aspectRatio = {0:Qt.IgnoreAspectRatio, 1:Qt.KeepAspectRatio, 2: Qt.KeepAspectRatioByExpanding}
+                    imageSize = QSizeF(self.imageMipmaps.size()).scaled(self.shapeRect().size(), aspectRatio[self.pickerItem.imageAspectRatio])
+                    self.imageRect = QRectF(QPointF(0, 0), imageSize)
+                    self.setZValue(-1)
+
+        self.updateBoundingRect()
+
+        if dirty & SceneItem.DirtyGeometry:
+            self.updateScaleAnchor()
+
+    def imageKey(self): # content key in the image cache, None when there is no image
+        image = self.pickerItem.image
+        if image is not self._imageSource: # hash only when the image is changed
+            self._imageSource = image
+            self._imageKey = cachedImageSourceKey(image)
+
+        return self._imageKey
+
+    def loadImage(self):
+        return loadImageSource(self.pickerItem.image)
 
     def setUnitScale(self, scale):
         if self.scene():
@@ -746,26 +1614,135 @@ class SceneItem(QGraphicsItem):
 
             scene.mayaParameters.pickerIsModified = True
 
+        elif change == QGraphicsItem.ItemPositionHasChanged:
+            if self.virtualItem is not None: # keep the virtual layout in place, i.e after a middle drag
+                scene.updateVirtualItemRect(self.virtualItem)
+
         return super(SceneItem, self).itemChange(change, value)
 
+    def setShadowEnabled(self, v):
+        if v == self.hasShadow:
+            return
+
+        self.prepareGeometryChange()
+        self.invalidateRenderCache()
+        self.hasShadow = v
+        self.updateBoundingRect()
+
     def updateScaleAnchor(self):
-        boundingRect = self.boundingRect()
+        boundingRect = self.shapeRect()
         offset = ScaleAnchorItem.Size/2
         self.scaleAnchorItem.setPos(boundingRect.width()-offset, boundingRect.height()-offset)
 
+    def shapeRect(self): # item geometry used for layout, without shadow
+        return self.painterPath.boundingRect()
+
+    def updateBoundingRect(self): # shape, label, image and shadow with room for cosmetic outlines
+        rect = self.painterPath.boundingRect()
+        if self.pickerItem.label and not self.pickerItem.image:
+            _, staticText, textPos = self._labelLayout
+            rect = rect.united(QRectF(textPos, staticText.size()))
+
+        if not self.imageRect.isEmpty(): # expanded images are larger than the shape
+            rect = rect.united(self.imageRect)
+
+        if self.hasShadow:
+            rect = rect.united(rect.translated(SceneItem.ShadowOffset, SceneItem.ShadowOffset))
+
+        self._boundingRect = enlargeRect(rect, 1)
+
     def boundingRect(self):
-        return self.shape().boundingRect()
+        return QRectF(self._boundingRect)
 
     def shape(self):
         return self.painterPath
 
+    def invalidateRenderCache(self):
+        self._renderCache = {}
+
+    def renderState(self):
+        return (self.isSelected(), self.isHover, self.isMayaControlHidden, self.isMayaControlInvalid, self.scene().editMode())
+
+    def cachedRender(self, rect, deviceScale):
+        deviceScale = 2 ** (round(math.log2(max(deviceScale, 0.01)) * 4) / 4.0) # quantize zoom, so rendered states are reused while zooming
+
+        width = math.ceil(rect.width() * deviceScale)
+        height = math.ceil(rect.height() * deviceScale)
+        if max(width, height) > SceneItem.RenderCacheMaxPixmapSize:
+            return None
+
+        key = (self.renderState(), deviceScale)
+        pixmap = self._renderCache.get(key)
+        if pixmap is None:
+            if len(self._renderCache) >= SceneItem.RenderCacheSize:
+                self._renderCache = {}
+
+            pixmap = QPixmap(width, height)
+            pixmap.fill(Qt.transparent)
+
+            painter = QPainter(pixmap)
+            painter.setRenderHints(QPainter.Antialiasing)
+            painter.scale(deviceScale, deviceScale)
+            painter.translate(-rect.topLeft())
+            self.paintItem(painter, deviceScale)
+            painter.end()
+
+            self._renderCache[key] = pixmap
+        return pixmap
+
     def paint(self, painter, option, widget=None):
         painter.setRenderHints(QPainter.Antialiasing)
+        deviceScale = option.levelOfDetailFromTransform(painter.worldTransform()) * (widget.devicePixelRatioF() if widget else 1)
+
+        if self.scene().renderCacheEnabled and not self.pickerItem.image:
+            rect = self.boundingRect()
+            pixmap = self.cachedRender(rect, deviceScale)
+            if pixmap:
+                painter.drawPixmap(rect, pixmap, QRectF(pixmap.rect()))
+                return
+
+        self.paintItem(painter, deviceScale)
+
+    def updateLabelLayout(self): # label is laid out once per label, font or geometry change
+        if self.pickerItem.font:
+            font = QFont()
+            font.fromString(self.pickerItem.font)
+        else:
+            font = QApplication.font()
+            font.setBold(True)
 
-        boundingRect = self.boundingRect()
+        fontMetrics = QFontMetrics(font)
+        textSize = fontMetrics.boundingRect(self.pickerItem.label)
+        baselinePos = self.shapeRect().center() - QPoint(textSize.width()/2, -textSize.height()/4)
+
+        staticText = QStaticText(self.pickerItem.label)
+        staticText.setTextFormat(Qt.PlainText)
+        staticText.prepare(QTransform(), font)
+
+        self._labelLayout = (font, staticText, baselinePos - QPointF(0, fontMetrics.ascent())) # static text is positioned by its top left corner
+
+    def paintShadow(self, painter):
+        offset = QPointF(SceneItem.ShadowOffset, SceneItem.ShadowOffset)
+
+        if self.pickerItem.image:
+            painter.fillRect(self.imageRect.translated(offset), SceneItem.ShadowColor)
+        elif self.pickerItem.background:
+            painter.fillPath(self.painterPath.translated(offset), SceneItem.ShadowColor)
+
+    def imagePixmapForScale(self, deviceScale): # smallest mipmap that is still not magnified on screen
+        return self.imageMipmaps.pixmapForWidth(self.imageRect.width() * deviceScale)
+
+    def paintItem(self, painter, deviceScale=1):
+        boundingRect = self.shapeRect()
+
+        if self.hasShadow:
+            self.paintShadow(painter)
 
         if self.pickerItem.image:
-            painter.drawPixmap(0,0,self.imagePixmap)
+            if self.imageMipmaps:
+                pixmap = self.imagePixmapForScale(deviceScale)
+                painter.setRenderHint(QPainter.SmoothPixmapTransform)
+                painter.drawPixmap(self.imageRect, pixmap, QRectF(pixmap.rect()))
 
         else:
             if self.pickerItem.background:
@@ -809,20 +1786,15 @@ class SceneItem(QGraphicsItem):
 
             # label
             if self.pickerItem.label:
-                painter.setPen(QColor(self.pickerItem.foreground))
+                font, staticText, textPos = self._labelLayout
+                painter.setFont(font)
 
-                if self.pickerItem.font:
-                    font = QFont()
-                    font.fromString(self.pickerItem.font)
-                    painter.setFont(font)
-                else:
-                    font = painter.font()
-                    font.setBold(True)
-                    painter.setFont(font)
+                if self.hasShadow:
+                    painter.setPen(SceneItem.ShadowColor)
+                    painter.drawStaticText(textPos + QPointF(SceneItem.ShadowOffset, SceneItem.ShadowOffset), staticText)
 
-                fontMetrics = QFontMetrics(painter.font())
-                textSize = fontMetrics.boundingRect(self.pickerItem.label)
-                painter.drawText(boundingRect.center() - QPoint(textSize.width()/2, -textSize.height()/4), self.pickerItem.label)
+                painter.setPen(QColor(self.pickerItem.foreground))
+                painter.drawStaticText(textPos, staticText)
 
         if self.isSelected():
             painter.setBrush(Qt.NoBrush)
@@ -832,6 +1804,9 @@ class SceneItem(QGraphicsItem):
             painter.drawRect(boundingRect)
 
     def hoverMoveEvent(self, event):
+        if self.isHover: # repaint only when hover state is changed
+            return
+
         self.isHover = True
         if not self.pickerItem.image:
             self.setCursor(Qt.PointingHandCursor)
@@ -849,7 +1824,6 @@ class SceneItem(QGraphicsItem):
         if not scene.editMode() and self.pickerItem.group:
             found = scene.findItemsByProperty("group", self.pickerItem.group)
 
-            oldSelection = scene.sortedSelection()
             scene.blockSignals(True)
 
             for item in found:
@@ -921,9 +1895,192 @@ class SceneItem(QGraphicsItem):
             if scene.mayaParameters.pickerIsModified:
                 scene.mayaParameters.pickerWindow.saveToMayaNode()
 
+class SelectionModel(object): # insertion ordered set of selected items
+    def __init__(self):
+        self._items = OrderedDict()
+        self.version = 0 # changes with every modification, identifies selection state
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def items(self):
+        return list(self._items)
+
+    def last(self):
+        return next(reversed(self._items)) if self._items else None
+
+    def add(self, item): # already added items keep their place
+        self.addItems([item])
+
+    def addItems(self, items):
+        count = len(self._items)
+        for item in items:
+            self._items.setdefault(item, None)
+
+        if len(self._items) != count:
+            self.version += 1
+
+    def remove(self, item):
+        self.removeItems([item])
+
+    def removeItems(self, items):
+        count = len(self._items)
+        for item in items:
+            self._items.pop(item, None)
+
+        if len(self._items) != count:
+            self.version += 1
+
+    def clear(self):
+        if self._items:
+            self._items.clear()
+            self.version += 1
+
+def estimateSize(value, counted=None): # rough memory used by undo data in bytes, strings are shared, so each one (by id in counted) is counted once
+    if counted is None:
+        counted = set()
+
+    if isinstance(value, (str, bytes)):
+        if id(value) in counted:
+            return 0
+        counted.add(id(value))
+        return 49 + len(value)
+    elif isinstance(value, (list, tuple)):
+        return 56 + 8 * len(value) + sum(estimateSize(v, counted) for v in value)
+    elif isinstance(value, PickerItem):
+        return 56 + 8 * len(PickerItem.__slots__) + sum(estimateSize(getattr(value, f), counted) for f in PickerItem.__slots__)
+    return 24
+
+class UndoAction(object): # a step of undo or redo, func does the step and returns UndoAction doing the opposite
+    __slots__ = ["func", "size"]
+
+    def __init__(self, func, size=0):
+        self.func = func
+        self.size = size # estimated bytes of the data kept by func
+
+    def __call__(self):
+        return self.func()
+
+class UndoJournal(object): # undo and redo stacks limited by memory, oldest operations are dropped first
+    def __init__(self, maxBytes=64*1024*1024):
+        self.maxBytes = maxBytes
+        self.undoStack = [] # [(id, UndoAction)], where id identifies undo operation
+        self.redoStack = []
+        self.bytes = 0
+        self.mergeId = None # operation new ones with the same id are merged into
+
+    def push(self, operationId, action):
+        self.clearRedo()
+
+        self.undoStack.append((operationId, action))
+        self.bytes += action.size
+        self.mergeId = operationId
+
+        self.evict()
+
+    def newBlock(self): # next operation is never merged into the last one
+        self.mergeId = None
+
+    def canUndo(self):
+        return bool(self.undoStack)
+
+    def canRedo(self):
+        return bool(self.redoStack)
+
+    def undo(self):
+        self.step(self.undoStack, self.redoStack)
+
+    def redo(self):
+        self.step(self.redoStack, self.undoStack)
+
+    def step(self, fromStack, toStack):
+        operationId, action = fromStack.pop()
+        self.bytes -= action.size
+
+        opposite = action()
+        if opposite is not None:
+            toStack.append((operationId, opposite))
+            self.bytes += opposite.size
+
+        self.mergeId = None
+        self.evict()
+
+    def evict(self): # oldest undo operations first, but the last one, then farthest redo operations
+        while self.bytes > self.maxBytes and len(self.undoStack) > 1:
+            _, action = self.undoStack.pop(0)
+            self.bytes -= action.size
+
+        while self.bytes > self.maxBytes and self.redoStack:
+            _, action = self.redoStack.pop(0)
+            self.bytes -= action.size
+
+    def clearRedo(self):
+        for _, action in self.redoStack:
+            self.bytes -= action.size
+        self.redoStack = []
+
+    def clear(self):
+        self.undoStack = []
+        self.redoStack = []
+        self.bytes = 0
+        self.mergeId = None
+
+    def setMaxBytes(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.evict()
+
+    def stats(self):
+        return {"undo": len(self.undoStack), "redo": len(self.redoStack), "bytes": self.bytes, "maxBytes": self.maxBytes}
+
+class VirtualItem(object): # lightweight stand-in for a SceneItem, Scene creates the SceneItem only when it's needed
+    __slots__ = ["scene_ref", "pickerItem", "shapeRect", "rect", "order", "sceneItem", "isMayaControlHidden", "isMayaControlInvalid", "__weakref__"]
+
+    def __init__(self, scene, pickerItem, shapeRect, rect, order):
+        self.scene_ref = weakref.ref(scene)
+        self.pickerItem = pickerItem
+        self.shapeRect = shapeRect # in scene coordinates
+        self.rect = rect # shapeRect with label and shadow
+        self.order = order # index in the picker
+        self.sceneItem = None
+
+        self.isMayaControlHidden = False
+        self.isMayaControlInvalid = False
+
+    def isSelected(self):
+        return self.sceneItem is not None and self.sceneItem.isSelected()
+
+    def setSelected(self, v):
+        if v:
+            scene = self.scene_ref()
+            if scene is not None:
+                scene.materializeItem(self).setSelected(True)
+
+        elif self.sceneItem is not None:
+            self.sceneItem.setSelected(False)
+
+    def update(self): # Maya callbacks change states of the virtual item
+        if self.sceneItem is not None:
+            self.sceneItem.isMayaControlHidden = self.isMayaControlHidden
+            self.sceneItem.isMayaControlInvalid = self.isMayaControlInvalid
+            self.sceneItem.update()
+
 class Scene(QGraphicsScene):
     editModeChanged = Signal(bool)
 
+    IndexedProperties = ["group", "control", "label"]
+    UndoFields = {"move": ["position"], "scale": ["scale", "position"]} # fields kept by undoAppendForSelected, all by default
+
+    VirtualItemsThreshold = 2000 # bigger pickers create SceneItems only around the visible area
+    VirtualMaxItems = 1000 # when more virtual items are visible, they are drawn as previews by the view
+    VirtualMargin = 200 # area around the visible rect with SceneItems
+    VirtualGridSize = 256
+
     def __init__(self, propertiesWidget, mayaParameters, **kwargs):
         super(Scene, self).__init__(**kwargs)
 
@@ -932,14 +2089,27 @@ class Scene(QGraphicsScene):
         self.mayaParameters = mayaParameters
 
         self.isImagesLocked = False
+        self.shadowsEnabled = True
+        self.renderCacheEnabled = False # draw items from cached pixmaps
 
         self._editMode = False
-        self._sortedSelection = []
+        self._selection = SelectionModel()
+
+        self._propertyIndex = {prop: {} for prop in Scene.IndexedProperties} # {prop: {value: {item: None}}}, dicts keep items ordered
+        self._indexedValues = {} # {item: {prop: value}}, what item is indexed by
+
+        self._virtualItems = [] # [VirtualItem] in picker order
+        self._virtualGrid = {} # {(x, y): [VirtualItem]}, cells of VirtualGridSize
+        self._virtualBounds = QRectF()
+        self._virtualRect = QRectF() # last visible rect
+        self._virtualOverview = False
+        self._materializedItems = OrderedDict() # {VirtualItem: None}
 
         self.undoEnabled = True
         self._undoDisableOder = 0 # beginEditBlock/endEditBlock inc/dec this
-        self._undoStack = [] # [(id, function), (id, function)], where id identifies undo operation, function is a recover function
-        self._undoTempStack = []
+        self._undoJournal = UndoJournal()
+        self._undoTempStack = [] # [(id, UndoAction)] of the current edit block
+        self._undoTempMergeId = None
 
         self.selectionChanged.connect(self.selectionChangedCallback)
 
@@ -955,6 +2125,10 @@ class Scene(QGraphicsScene):
 
         propItem = self.propertiesWidget.pickerItem.duplicate()
         changedProperties = self.propertiesWidget.changedProperties
+
+        dirty = SceneItem.DirtyNothing # only what the changed properties affect is recomputed
+        for prop in changedProperties:
+            dirty |= SceneItem.PropertyDirtyFlags.get(prop, SceneItem.DirtyAll)
         for item in self.sortedSelection():
             if "svgpath" in changedProperties:
                 item.pickerItem.svgpath = propItem.svgpath
@@ -996,37 +2170,55 @@ class Scene(QGraphicsScene):
                 item.pickerItem.script = propItem.script
 
             self.propertiesWidget.changedProperties = []
-            item.updateShape()
+            item.updateShape(dirty)
+            self.updateItemIndex(item)
 
     def findItemsByProperty(self, propname, propvalue):
+        if propname in self._propertyIndex:
+            return [self.materializeItem(item) for item in self._propertyIndex[propname].get(propvalue, [])]
+
         found = []
         for item in self.items():
             if isinstance(item, SceneItem) and item.pickerItem.__getattribute__(propname) == propvalue:
                 found.append(item)
         return found
 
-    def updateSortedSelection(self):
-        # add prev selection into undo stack
-        current_selection = self.sortedSelection()[:]
-        undoFunc = lambda items=current_selection: (self.clearSelection(), [item.setSelected(True) for item in items])
-        self.undoAppend("selection", undoFunc, str([id(item) for item in current_selection]))
+    def updateSortedSelection(self, orderedItems=[]):
+        if self.undoEnabled and self.editMode(): # add prev selection into undo stack
+            self.undoAppend("selection", self.selectionUndoAction(self.sortedSelection()), self._selection.version)
 
-        # sort selected items by distance to origin
-        sceneOrigin = self.sceneRect().topLeft()
-        selectedItems = sorted(self.selectedItems(), key=lambda item: QVector2D(sceneOrigin-item.pos()).length())
+        selectedItems = self.selectedItems()
+        if not selectedItems:
+            self._selection.clear()
+            return
 
-        if selectedItems:
-            self._sortedSelection = [item for item in self._sortedSelection if item.isSelected()]
+        selectedSet = set(selectedItems)
+        self._selection.removeItems([item for item in self._selection if item not in selectedSet])
 
-            for sel in selectedItems:
-                if sel not in self._sortedSelection:
-                    self._sortedSelection.append(sel)
+        # orderedItems go first in the given order, other new items are sorted by distance to origin
+        self._selection.addItems([item for item in orderedItems if item in selectedSet])
 
-        else:
-            del self._sortedSelection[:]
+        newItems = [item for item in selectedItems if item not in self._selection]
+        if newItems:
+            sceneOrigin = self.sceneRect().topLeft()
+            newItems.sort(key=lambda item: QVector2D(sceneOrigin-item.pos()).length())
+            self._selection.addItems(newItems)
 
-    def selectionChangedCallback(self):
-        self.updateSortedSelection()
+    def selectItems(self, items, add=False): # select many items with a single selection update, items keep their order
+        items = [self.materializeItem(item) for item in items] # virtual items get their SceneItems
+        self.blockSignals(True)
+
+        if not add:
+            self.clearSelection()
+
+        for item in items:
+            item.setSelected(True)
+
+        self.blockSignals(False)
+        self.selectionChangedCallback(items)
+
+    def selectionChangedCallback(self, orderedItems=[]):
+        self.updateSortedSelection(orderedItems)
         self.updateProperties()
 
         if not self.editMode():
@@ -1040,7 +2232,10 @@ class Scene(QGraphicsScene):
             cmds.select(nodes)
 
     def sortedSelection(self):
-        return self._sortedSelection[:]
+        return self._selection.items()
+
+    def selectionVersion(self): # identifies current selection in undo operations
+        return self._selection.version
 
     def beginEditBlock(self):
         self._undoDisableOder += 1
@@ -1048,72 +2243,151 @@ class Scene(QGraphicsScene):
     def endEditBlock(self):
         self._undoDisableOder -= 1
 
-        # append all temporary operations as a single undo function
+        # append all temporary operations as a single undo action
         if self._undoTempStack and not self.isInEditBlock():
-            tempStackFunc = lambda lst=self._undoTempStack: [f() for _,f in lst]
-            self.undoAppend("temp", tempStackFunc)
+            actions = [action for _, action in self._undoTempStack]
             self._undoTempStack = []
+            self._undoTempMergeId = None
+            self.undoAppend("temp", self.groupUndoAction(actions))
 
     def isInEditBlock(self):
         return self._undoDisableOder > 0
 
     def undoNewBlock(self): # used to separate operations from previous onces
-        self.undoAppend("newBlock", None)
+        if self.isInEditBlock():
+            self._undoTempMergeId = None
+        else:
+            self._undoJournal.newBlock()
 
     def undoAppendForSelected(self, name):
-        funcList = []
-        for item in self.sortedSelection():
-            f = lambda item=item, state=item.pickerItem.duplicate(): (item.pickerItem.copy(state),
-                                                                      item.updateShape(),
-                                                                      item.setPos(state.position[0], state.position[1]))
-            funcList.append(f)
-        undoFunc = lambda funcList=funcList: [f() for f in funcList]
+        if not self.undoEnabled or not self.editMode():
+            return
+
+        if self.getUndoLastOperation() == "%s %s"%(name, self._selection.version): # would be merged with the last operation anyway
+            return
+
+        # keep only fields the operation changes
+        fields = Scene.UndoFields.get(name, PickerItem.__slots__)
+        snapshots = [(item, item.pickerItem.snapshot(fields)) for item in self.sortedSelection()]
+
+        self.undoAppend(name, self.snapshotsUndoAction(fields, snapshots), self._selection.version)
+
+    def selectionUndoAction(self, items): # restores selection
+        def func():
+            current = self.sortedSelection()
+            self.selectItems(items)
+            return self.selectionUndoAction(current)
 
-        self.undoAppend(name, undoFunc, str([id(item) for item in self.sortedSelection()]))
+        return UndoAction(func, estimateSize(items))
 
-    def undoAppend(self, name, undoFunc, operationId=None):
+    def snapshotsUndoAction(self, fields, snapshots): # restores fields of items, snapshots are [(item, values)]
+        def func():
+            current = [(item, item.pickerItem.snapshot(fields)) for item, _ in snapshots]
+            self.restoreSnapshots(fields, snapshots)
+            return self.snapshotsUndoAction(fields, current)
+
+        return UndoAction(func, estimateSize([values for _, values in snapshots]))
+
+    def itemsUndoAction(self, added, removed, selection): # removes added items, adds removed ones back and restores selection
+        def func():
+            current = self.sortedSelection()
+
+            for item in added:
+                self.removeItem(item)
+
+            for item in removed:
+                self.addItem(item)
+
+            self.selectItems(selection)
+            return self.itemsUndoAction(removed, added, current)
+
+        # images of the items are often held by the picker too, they cost nothing then
+        return UndoAction(func, estimateSize([item.pickerItem for item in added + removed], self.heldImageIds()) + estimateSize(selection))
+
+    def heldImageIds(self): # ids of images held by items of the scene
+        items = self._virtualItems if self.isVirtualized() else [item for item in self.items() if isinstance(item, SceneItem)]
+        return {id(item.pickerItem.image) for item in items if item.pickerItem.image}
+
+    def groupUndoAction(self, actions): # actions are done in reverse order
+        def func():
+            return self.groupUndoAction([action() for action in reversed(actions)])
+
+        return UndoAction(func, sum(action.size for action in actions))
+
+    def restoreSnapshots(self, fields, snapshots):
+        dirty = SceneItem.DirtyNothing
+        for f in fields:
+            dirty |= SceneItem.PropertyDirtyFlags.get(f, SceneItem.DirtyAll)
+
+        for item, values in snapshots:
+            item.pickerItem.restore(fields, values)
+            item.updateShape(dirty)
+            self.updateItemIndex(item)
+            item.setPos(item.pickerItem.position[0], item.pickerItem.position[1])
+
+    def undoAppend(self, name, undoAction, operationId=None):
         if not self.undoEnabled or not self.editMode():
             return
 
-        lastOp = self.getUndoLastOperation()
-
         cmd = "%s %s"%(name, operationId)
-        if operationId is not None and lastOp and lastOp[0] == cmd:
-            pass
-        else:
-            if self.isInEditBlock():
-                self._undoTempStack.append((cmd, undoFunc))
-            else:
-                self._undoStack.append((cmd, undoFunc))
+        if operationId is not None and self.getUndoLastOperation() == cmd: # merged with the last operation
+            return
 
-    def getUndoLastOperation(self):
         if self.isInEditBlock():
-            return self._undoTempStack[-1] if self._undoTempStack else None
+            self._undoTempStack.append((cmd, undoAction))
+            self._undoTempMergeId = cmd
         else:
-            return self._undoStack[-1] if self._undoStack else None
+            self._undoJournal.push(cmd, undoAction)
+
+    def getUndoLastOperation(self): # id of the operation new ones with the same id are merged into
+        return self._undoTempMergeId if self.isInEditBlock() else self._undoJournal.mergeId
 
     def flushUndo(self):
-        self._undoStack = []
+        self._undoJournal.clear()
+        self._undoTempStack = []
+        self._undoTempMergeId = None
 
-    def keyPressEvent(self, event):
-        ctrl = event.modifiers() & Qt.ControlModifier
+    def setUndoMaxBytes(self, maxBytes):
+        self._undoJournal.setMaxBytes(maxBytes)
 
-        if ctrl and event.key() == Qt.Key_Z:
-            if not self._undoStack:
-                print("Selection undo is empty")
-            else:
-                self.undoEnabled = False
+    def undoStats(self):
+        return self._undoJournal.stats()
+
+    def undo(self):
+        if not self._undoJournal.canUndo():
+            print("Undo is empty")
+            return
 
-                while True and self._undoStack:
-                    cmd, undoFunc = self._undoStack.pop()
+        self.undoEnabled = False
+        try:
+            self._undoJournal.undo()
+        finally:
+            self.undoEnabled = True
 
-                    if callable(undoFunc):
-                        undoFunc()
-                        break
+        self.updateProperties()
+
+    def redo(self):
+        if not self._undoJournal.canRedo():
+            print("Redo is empty")
+            return
 
-                self.undoEnabled = True
+        self.undoEnabled = False
+        try:
+            self._undoJournal.redo()
+        finally:
+            self.undoEnabled = True
 
-                self.updateProperties()
+        self.updateProperties()
+
+    def keyPressEvent(self, event):
+        ctrl = event.modifiers() & Qt.ControlModifier
+        shift = event.modifiers() & Qt.ShiftModifier
+
+        if ctrl and shift and event.key() == Qt.Key_Z:
+            self.redo()
+
+        elif ctrl and event.key() == Qt.Key_Z:
+            self.undo()
 
         else:
             super(Scene, self).keyPressEvent(event)
@@ -1121,10 +2395,282 @@ class Scene(QGraphicsScene):
     def editMode(self):
         return self._editMode
 
+    def addItem(self, item):
+        if isinstance(item, SceneItem):
+            self.devirtualize() # new items can't be mixed with virtual ones
+            item.setShadowEnabled(self.shadowsEnabled)
+        super(Scene, self).addItem(item)
+
+        if isinstance(item, SceneItem):
+            self.updateItemIndex(item)
+
+    def removeItem(self, item):
+        super(Scene, self).removeItem(item)
+
+        if isinstance(item, SceneItem):
+            self.removeItemIndex(item)
+
+    def clear(self):
+        super(Scene, self).clear()
+
+        self._propertyIndex = {prop: {} for prop in Scene.IndexedProperties}
+        self._indexedValues = {}
+
+        self._virtualItems = []
+        self._virtualGrid = {}
+        self._virtualBounds = QRectF()
+        self._virtualRect = QRectF()
+        self._virtualOverview = False
+        self._materializedItems = OrderedDict()
+
+    def itemsBoundingRect(self):
+        rect = super(Scene, self).itemsBoundingRect()
+        if self._virtualItems:
+            rect = rect.united(self._virtualBounds)
+        return rect
+
+    def isVirtualized(self):
+        return bool(self._virtualItems)
+
+    def isVirtualOverview(self): # too many virtual items are visible to create SceneItems for them
+        return self._virtualOverview
+
+    def virtualItems(self):
+        return self._virtualItems[:]
+
+    def virtualGridCells(self, rect):
+        size = float(Scene.VirtualGridSize)
+        for x in range(int(math.floor(rect.left() / size)), int(math.floor(rect.right() / size)) + 1):
+            for y in range(int(math.floor(rect.top() / size)), int(math.floor(rect.bottom() / size)) + 1):
+                yield (x, y)
+
+    def virtualItemsIn(self, rect):
+        rect = rect.intersected(self._virtualBounds)
+        if rect.isEmpty():
+            return []
+
+        found = {}
+        for cell in self.virtualGridCells(rect):
+            for item in self._virtualGrid.get(cell, []):
+                if item not in found and item.rect.intersects(rect):
+                    found[item] = None
+        return list(found)
+
+    def addVirtualItems(self, pickerItems): # items are indexed and laid out, SceneItems are created by updateVirtualItems
+        self.devirtualize()
+
+        defaultFont = QApplication.font()
+        defaultFont.setBold(True)
+        fontMetrics = {} # {font: QFontMetrics}
+        imageSizes = {} # {image: QSize}
+        shadowOffset = SceneItem.ShadowOffset if self.shadowsEnabled else 0
+
+        for pickerItem in pickerItems:
+            scaleX = pickerItem.scale[0] / 25 + 1
+            scaleY = pickerItem.scale[1] / 25 + 1
+            shapeRect = getPainterPathRect(pickerItem.svgpath, scaleX, scaleY, pickerItem.flipped[0], pickerItem.flipped[1], pickerItem.rotated)
+            shapeRect.translate(pickerItem.position[0], pickerItem.position[1])
+
+            rect = QRectF(shapeRect)
+            if pickerItem.label and not pickerItem.image: # same placement as SceneItem.updateLabelLayout
+                if pickerItem.font not in fontMetrics:
+                    font = QFont(defaultFont)
+                    if pickerItem.font:
+                        font.fromString(pickerItem.font)
+                    fontMetrics[pickerItem.font] = QFontMetrics(font)
+
+                metrics = fontMetrics[pickerItem.font]
+                textSize = metrics.boundingRect(pickerItem.label)
+                textPos = shapeRect.center() - QPointF(textSize.width()/2, metrics.ascent() - textSize.height()/4)
+                rect = rect.united(QRectF(textPos, QSizeF(textSize.width(), metrics.height())))
+
+            if pickerItem.image: # same size as SceneItem.imageRect, only expanded images get out of the shape
+                imageSize = shapeRect.size()
+                if pickerItem.imageAspectRatio == 2:
+                    if pickerItem.image not in imageSizes:
+                        imageSizes[pickerItem.image] = imageSourceSize(pickerItem.image)
+                    if imageSizes[pickerItem.image].isValid():
+                        imageSize = QSizeF(imageSizes[pickerItem.image]).scaled(imageSize, Qt.KeepAspectRatioByExpanding)
+                rect = rect.united(QRectF(QPointF(pickerItem.position[0], pickerItem.position[1]), imageSize))
+
+            rect = enlargeRect(rect.adjusted(0, 0, shadowOffset, shadowOffset), 2)
+
+            item = VirtualItem(self, pickerItem, shapeRect, rect, len(self._virtualItems))
+            self._virtualItems.append(item)
+            self._virtualBounds = self._virtualBounds.united(rect)
+            self.addVirtualGridItem(item)
+
+            self.updateItemIndex(item)
+
+        self._virtualRect = QRectF()
+
+    def addVirtualGridItem(self, item):
+        for cell in self.virtualGridCells(item.rect):
+            if cell not in self._virtualGrid:
+                self._virtualGrid[cell] = []
+            self._virtualGrid[cell].append(item)
+
+    def removeVirtualGridItem(self, item):
+        for cell in self.virtualGridCells(item.rect):
+            items = self._virtualGrid.get(cell)
+            if items and item in items:
+                items.remove(item)
+                if not items:
+                    del self._virtualGrid[cell]
+
+    def updateVirtualItemRect(self, item): # layout of a virtual item from its SceneItem, when it's moved
+        sceneItem = item.sceneItem
+        self.removeVirtualGridItem(item)
+
+        item.shapeRect = sceneItem.shapeRect().translated(sceneItem.pos())
+        item.rect = enlargeRect(sceneItem.sceneBoundingRect(), 2)
+        self._virtualBounds = self._virtualBounds.united(item.rect)
+
+        self.addVirtualGridItem(item)
+        self._virtualRect = QRectF() # visible items are updated with the next paint
+
+    def materializeItem(self, item): # SceneItem for a virtual item, other items are returned as is
+        if not isinstance(item, VirtualItem):
+            return item
+
+        if item.sceneItem is None:
+            sceneItem = SceneItem(item.pickerItem)
+            sceneItem.isMayaControlHidden = item.isMayaControlHidden
+            sceneItem.isMayaControlInvalid = item.isMayaControlInvalid
+            sceneItem.setShadowEnabled(self.shadowsEnabled)
+            super(Scene, self).addItem(sceneItem) # virtual items are indexed instead
+
+            sceneItem.setPos(item.pickerItem.position[0], item.pickerItem.position[1])
+            sceneItem.setZValue(sceneItem.zValue() + item.order / float(len(self._virtualItems))) # items are created in any order, keep the picker stacking
+
+            item.sceneItem = sceneItem
+            sceneItem.virtualItem = item
+            self._materializedItems[item] = None
+
+        return item.sceneItem
+
+    def dematerializeItem(self, item):
+        sceneItem = item.sceneItem
+        if sceneItem is None:
+            return
+
+        item.sceneItem = None
+        sceneItem.virtualItem = None
+        self._materializedItems.pop(item, None)
+        super(Scene, self).removeItem(sceneItem)
+
+    def updateVirtualItems(self, rect): # create SceneItems around the visible rect, remove distant ones
+        if not self._virtualItems or rect == self._virtualRect:
+            return
+
+        self._virtualRect = QRectF(rect)
+
+        margin = Scene.VirtualMargin
+        visibleItems = self.virtualItemsIn(enlargeRect(rect, margin))
+        self._virtualOverview = len(visibleItems) > Scene.VirtualMaxItems
+
+        if not self._virtualOverview:
+            for item in visibleItems:
+                self.materializeItem(item)
+
+        keepRect = enlargeRect(rect, margin*2) # don't recreate items when moving back and forth
+        for item in list(self._materializedItems):
+            if self._virtualOverview or not item.rect.intersects(keepRect):
+                if not item.sceneItem.isSelected() and not item.sceneItem.isHover:
+                    self.dematerializeItem(item)
+
+    def devirtualize(self): # replace virtual items with regular SceneItems in picker order
+        if not self._virtualItems:
+            return
+
+        virtualItems = self._virtualItems
+        self._virtualItems = []
+        self._virtualGrid = {}
+        self._virtualBounds = QRectF()
+        self._virtualRect = QRectF()
+        self._virtualOverview = False
+        self._materializedItems = OrderedDict()
+
+        self.blockSignals(True)
+
+        selected = []
+        for item in virtualItems:
+            self.removeItemIndex(item)
+
+            if item.sceneItem is not None:
+                if item.sceneItem.isSelected():
+                    selected.append(item.sceneItem)
+                item.sceneItem.virtualItem = None
+                super(Scene, self).removeItem(item.sceneItem) # added again below to restore stacking
+
+        for item in virtualItems:
+            sceneItem = item.sceneItem
+            if sceneItem is None:
+                sceneItem = SceneItem(item.pickerItem)
+                sceneItem.isMayaControlHidden = item.isMayaControlHidden
+                sceneItem.isMayaControlInvalid = item.isMayaControlInvalid
+
+            sceneItem.setZValue(math.floor(sceneItem.zValue()))
+            self.addItem(sceneItem)
+            sceneItem.setPos(item.pickerItem.position[0], item.pickerItem.position[1])
+
+        for item in selected:
+            item.setSelected(True)
+
+        self.blockSignals(False)
+
+    def updateItemIndex(self, item): # call when indexed properties of the item are changed
+        values = {prop: getattr(item.pickerItem, prop) for prop in Scene.IndexedProperties}
+        if self._indexedValues.get(item) == values:
+            return
+
+        self.removeItemIndex(item)
+
+        for prop, value in values.items():
+            index = self._propertyIndex[prop]
+            if value not in index:
+                index[value] = {}
+            index[value][item] = None
+
+        self._indexedValues[item] = values
+
+    def removeItemIndex(self, item):
+        values = self._indexedValues.pop(item, None)
+        if not values:
+            return
+
+        for prop, value in values.items():
+            items = self._propertyIndex[prop].get(value)
+            if items is not None:
+                items.pop(item, None)
+                if not items:
+                    del self._propertyIndex[prop][value]
+
+    def propertyIndex(self, propname): # {value: [SceneItem]}
+        return {value: list(items) for value, items in self._propertyIndex[propname].items()}
+
+    def setShadowsEnabled(self, v):
+        self.shadowsEnabled = v
+
+        for item in self.items():
+            if isinstance(item, SceneItem):
+                item.setShadowEnabled(v)
+
+    def setRenderCacheEnabled(self, v):
+        self.renderCacheEnabled = v
+
+        for item in self.items():
+            if isinstance(item, SceneItem):
+                item.invalidateRenderCache()
+                item.update()
+
     def setEditMode(self, v):
         if v == self._editMode:
             return
 
+        if v: # editing works with regular items only
+            self.devirtualize()
+
         for item in self.selectedItems():
             if isinstance(item, SceneItem):
                 item.scaleAnchorItem.setVisible(v)
@@ -1137,10 +2683,38 @@ class Scene(QGraphicsScene):
 
         self.editModeChanged.emit(v)
 
+class PickerLoad(object): # state of a picker loaded by View in batches
+    def __init__(self, future, asImport):
+        self.future = future # parsed picker
+        self.asImport = asImport
+        self.picker = None
+        self.pickerItems = [] # items to create scene items for
+        self.index = 0 # next item to create
+        self.newItems = []
+        self.oldSelection = []
+        self.imageFutures = {} # {image: future of (key, QImage)}
+        self.stepTime = 0.0 # end of the last batch
+        self.repaintTime = 0.0
+        self.repaintCost = 0.0 # seconds between batches when the view was repainted
+        self.repainted = False # the view is repainted after the last batch
+        self.transform = None # after the first batch, the view is framed again at the end unless the user changed it
+
 class View(QGraphicsView):
-    pickerLoaded = Signal(object, bool) # picker, asImport (True, False)
+    pickerLoaded = Signal(object, bool) # picker, asImport (True, False), emitted when loading is complete
+    loadProgress = Signal(int, int) # created items, all items (-1 while the picker is parsed), equal when loading is done
+    loadFutureDone = Signal() # a parsed picker or decoded image is ready, emitted from LoadThreadPool
+    loadFailed = Signal(object) # exception raised while the picker was parsed, loading is canceled
     somethingDropped = Signal()
 
+    LoadBatchTime = 0.010 # seconds of creating scene items per event loop iteration
+    LoadMaxBatchTime = 0.100 # batches grow up to it when repainting the loaded items takes long
+    LoadRepaintInterval = 0.5 # seconds between repaints while loading, input is still handled after every batch
+
+    UpdateModes = [("Full", QGraphicsView.FullViewportUpdate),
+                   ("Minimal", QGraphicsView.MinimalViewportUpdate),
+                   ("Smart", QGraphicsView.SmartViewportUpdate),
+                   ("Bounding rect", QGraphicsView.BoundingRectViewportUpdate)]
+
     def __init__(self, scene, **kwargs):
         super(View, self).__init__(scene, **kwargs)
 
@@ -1152,11 +2726,108 @@ class View(QGraphicsView):
 
         self.setTransformationAnchor(QGraphicsView.AnchorViewCenter)
         self.setMouseTracking(True)
-        self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
+        self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate) # items repaint only their bounding rects
+        self.setCacheMode(QGraphicsView.CacheBackground)
         self.setAcceptDrops(True)
 
         self.setSceneRect(QRect(0,0, 300, 400))
 
+        self.hudEnabled = False
+        self._hudRect = QRect(4, 4, 230, 110)
+        self._hudTimer = QTimer(self) # HUD is refreshed on its own, partial updates don't always cover it
+        self._hudTimer.setInterval(250)
+        self._hudTimer.timeout.connect(lambda: self.viewport().update(self._hudRect))
+        self._frameTime = 0.0
+
+        self._load = None
+        self._loadTimer = QTimer(self)
+        self._loadTimer.setInterval(0) # next batch as soon as events are processed, stopped while waiting for the pool
+        self._loadTimer.timeout.connect(lambda: self.loadStep())
+        self.loadFutureDone.connect(self.resumeLoad)
+
+    def setHudEnabled(self, v):
+        self.hudEnabled = v
+        if v:
+            self._hudTimer.start()
+        else:
+            self._hudTimer.stop()
+        self.viewport().update()
+
+    def updateVirtualItems(self): # create scene items for the visible area of a virtualized picker
+        scene = self.scene()
+        if not scene.isVirtualized():
+            return
+
+        wasOverview = scene.isVirtualOverview()
+        scene.updateVirtualItems(self.mapToScene(self.viewport().rect()).boundingRect())
+
+        if scene.isVirtualOverview() != wasOverview: # previews are drawn with the background
+            self.resetCachedContent()
+
+    def paintEvent(self, event):
+        startTime = time.perf_counter()
+        self.updateVirtualItems()
+        super(View, self).paintEvent(event)
+
+        if event.rect() != self._hudRect: # don't count HUD refreshes as frames
+            self._frameTime = time.perf_counter() - startTime
+
+    def drawBackground(self, painter, rect):
+        super(View, self).drawBackground(painter, rect)
+
+        scene = self.scene()
+        if not scene.isVirtualOverview():
+            return
+
+        # too many items to create, draw them as plain shapes until zoomed in
+        colors = {}
+        for item in scene.virtualItemsIn(rect):
+            if item.sceneItem is None:
+                background = item.pickerItem.background
+                if background not in colors:
+                    colors[background] = QColor(background) if background else QColor(128, 128, 128)
+                painter.fillRect(item.shapeRect, colors[background])
+
+    def drawForeground(self, painter, rect):
+        super(View, self).drawForeground(painter, rect)
+
+        if not self.hudEnabled:
+            return
+
+        scene = self.scene()
+        mayaParameters = scene.mayaParameters
+
+        items = [item for item in scene.items() if isinstance(item, SceneItem)]
+        visibleItems = [item for item in self.items(self.viewport().rect()) if isinstance(item, SceneItem)]
+
+        payloadStats = nodePayloadStats()
+
+        lines = ["Frame: %.1f ms" % (self._frameTime*1000),
+                 "Items: %d (visible %d, virtual %d)" % (len(items), len(visibleItems), len(scene.virtualItems())),
+                 "Script jobs: %d" % len(mayaParameters.callbacks),
+                 "Image cache: %.1f MB" % (ImageCacheInstance.stats()["bytes"] / 1024.0 / 1024.0),
+                 "Last save: %.1f ms" % (mayaParameters.lastSaveTime*1000),
+                 "Node data: %.1f KB in %d attributes (x%.1f)" % (payloadStats["storedBytes"] / 1024.0, payloadStats["writtenAttributes"], payloadStats["ratio"]),
+                 "Last callbacks install: %.1f ms" % (mayaParameters.lastInstallCallbacksTime*1000)]
+
+        painter.save()
+        painter.resetTransform() # draw in viewport coordinates
+
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor(0, 0, 0, 150))
+        painter.drawRect(self._hudRect)
+
+        font = painter.font()
+        font.setPointSize(8)
+        painter.setFont(font)
+        painter.setPen(QColor(255, 255, 255))
+
+        lineHeight = QFontMetrics(font).height()
+        for i, line in enumerate(lines):
+            painter.drawText(self._hudRect.left()+6, self._hudRect.top()+4+lineHeight*(i+1), line)
+
+        painter.restore()
+
     def contextMenuEvent(self, event):
         if not self.scene().editMode():
             return
@@ -1192,6 +2863,7 @@ class View(QGraphicsView):
             ok = quiet or QMessageBox.question(self, "Picker", "Clear current and make new picker?",
                                                QMessageBox.Yes and QMessageBox.No, QMessageBox.Yes) == QMessageBox.Yes
             if ok:
+                self.cancelLoad()
                 self.setTransform(QTransform()) # reset scale
                 self.scene().setEditMode(True)
                 self.scene().clear()
@@ -1200,46 +2872,49 @@ class View(QGraphicsView):
             PickerWindow().show()
 
     def toPicker(self, selected=False):
+        self.finishLoad() # items that are still loading are included
         picker = Picker()
-        for item in self.scene().items()[::-1]: # reverse to make the list from the first birth
-            if isinstance(item, SceneItem):
-                if selected and not item.isSelected():
-                    continue
 
-                picker.items.append(item.pickerItem)
+        if self.scene().isVirtualized(): # virtual items are kept in picker order
+            items = self.scene().virtualItems()
+        else:
+            items = [item for item in self.scene().items()[::-1] if isinstance(item, SceneItem)] # reverse to make the list from the first birth
+
+        for item in items:
+            if selected and not item.isSelected():
+                continue
+
+            picker.items.append(item.pickerItem)
 
         picker.size = [self.viewport().width(), self.viewport().height()]
         picker.scale = self.getViewportScale()[0] # use sx
+        picker.shadows = self.scene().shadowsEnabled
         return picker
 
     def savePicker(self, selected=False):
-        path, _ = QFileDialog.getSaveFileName(None, "Save picker", "", "*.picker")
+        sharedFilter = "Compact picker with shared tables (*.picker)"
+        path, selectedFilter = QFileDialog.getSaveFileName(None, "Save picker", "", "Picker (*.picker);;%s;;Binary picker (*%s)"%(sharedFilter, BinaryPickerExtension))
 
         if path:
-            picker = self.toPicker(selected)
-
-            with open(path, "w") as f:
-                json.dump(picker.toJson(), f, indent=4)
+            savePickerFile(self.toPicker(selected), path, sharedTables=selectedFilter==sharedFilter)
 
-    def loadPickerFromFile(self):
-        path, _ = QFileDialog.getOpenFileName(None, "Load picker", "", "*.picker")
-
-        if path:
-            picker = Picker()
-            with open(path, "r") as f:
-                picker.fromJson(json.load(f))
-            return picker
+    def openPickerFile(self):
+        path, _ = QFileDialog.getOpenFileName(None, "Load picker", "", "Picker (*.picker *%s)"%BinaryPickerExtension)
+        return path
 
     def selectAllItems(self):
         oldSelection = self.scene().sortedSelection()
         scene = self.scene()
 
-        undoFunc = lambda scene=scene, items=oldSelection: (scene.clearSelection(), [item.setSelected(True) for item in items])
-        scene.undoAppend("selection", undoFunc, str([id(item) for item in oldSelection]))
+        scene.undoAppend("selection", scene.selectionUndoAction(oldSelection), scene.selectionVersion())
+
+        if scene.isVirtualized(): # items without SceneItems too
+            items = scene.virtualItems()
+        else:
+            items = [item for item in scene.items() if item.flags() & QGraphicsItem.ItemIsSelectable]
 
         scene.beginEditBlock()
-        for item in scene.items():
-            item.setSelected(True)
+        scene.selectItems(items, add=True)
         scene.endEditBlock()
 
     def replaceInNames(self):
@@ -1252,57 +2927,177 @@ class View(QGraphicsView):
                 for item in selection:
                     item.pickerItem.control = item.pickerItem.control.replace(old,new)
                     item.pickerItem.group = item.pickerItem.group.replace(old,new)
+                    self.scene().updateItemIndex(item)
 
                 self.scene().updateProperties()
             else:
                 QMessageBox.critical(self, "Replace", "Invalid replace format. Must be 'old=new', i.e L_=R_")
 
     def loadPicker(self, picker=None, asImport=False):
+        # picker or a function returning it, the function is run in LoadThreadPool.
+        # Scene items are created in batches, so the picker can be used while it's loading
         if not picker:
-            picker = self.loadPickerFromFile()
-        if not picker:
+            path = self.openPickerFile()
+            if not path:
+                return
+            picker = lambda: loadPickerFile(path)
+
+        self.finishLoad() # previous picker is completed first
+
+        if callable(picker):
+            future = LoadThreadPool.submit(picker)
+        else:
+            future = Future()
+            future.set_result(picker)
+
+        self._load = PickerLoad(future, asImport)
+        self.loadProgress.emit(0, -1)
+        future.add_done_callback(lambda _: self.loadFutureDone.emit()) # starts the timer
+
+    def resumeLoad(self):
+        if self._load:
+            self._loadTimer.start()
+
+    def isLoading(self):
+        return self._load is not None
+
+    def finishLoad(self): # create remaining items right now, i.e before the picker is saved
+        while self._load:
+            self.loadStep(wait=True)
+
+    def cancelLoad(self):
+        load = self._load
+        if not load:
             return
 
+        self._loadTimer.stop()
+        self._load = None
+        self.viewport().setUpdatesEnabled(True)
+
+        if load.picker:
+            self.scene().endEditBlock()
+        self.loadProgress.emit(0, 0)
+
+    def startLoad(self, load): # main thread part once the picker is parsed
+        picker = load.picker
         scene = self.scene()
-        scene.beginEditBlock()
+        scene.beginEditBlock() # till the end of loading
 
-        oldSelection = scene.sortedSelection()
+        load.oldSelection = scene.sortedSelection()
 
-        if asImport:
+        if load.asImport:
             scene.clearSelection()
         else:
             scene.clear()
+            scene.flushUndo() # undo refers to removed items, the picker can be edited before loading is complete
+            scene.setShadowsEnabled(picker.shadows)
 
-        newItems = []
-        for pickerItem in picker.items:
-            item = SceneItem(pickerItem)
-            scene.addItem(item)
+        if not load.asImport and not scene.editMode() and len(picker.items) > Scene.VirtualItemsThreshold:
+            scene.addVirtualItems(picker.items) # scene items are created for the visible area only
+        else:
+            load.pickerItems = picker.items
 
-            item.setPos(item.pickerItem.position[0], item.pickerItem.position[1])
+            for pickerItem in load.pickerItems: # decode distinct images in parallel
+                if pickerItem.image and pickerItem.image not in load.imageFutures:
+                    future = LoadThreadPool.submit(decodeImageSource, pickerItem.image)
+                    future.add_done_callback(lambda _: self.loadFutureDone.emit())
+                    load.imageFutures[pickerItem.image] = future
 
-            if asImport:
-                item.setSelected(True)
+    def loadStep(self, wait=False): # creates a batch of items, with wait it doesn't return until something is done
+        load = self._load
+        scene = self.scene()
+
+        if load.picker is None:
+            if not wait and not load.future.done():
+                self._loadTimer.stop() # resumed by loadFutureDone
+                return
 
-            newItems.append(item)
+            try:
+                load.picker = load.future.result()
+            except Exception as e:
+                self.cancelLoad()
+                self.loadFailed.emit(e)
+                raise
+
+            if not load.picker:
+                self.cancelLoad()
+                return
 
-        scene.endEditBlock()
+            self.startLoad(load)
 
-        if not asImport: # clear undo when just open new picker
-            scene.flushUndo()
+        startTime = time.perf_counter()
+        if load.repainted:
+            load.repaintCost = startTime - load.stepTime
+        batchTime = clamp(2 * (startTime - load.stepTime), View.LoadBatchTime, View.LoadMaxBatchTime) # most of the time goes to loading
 
-            self.setTransform(QTransform()) # reset scale
-            self.scale(picker.scale, picker.scale)
-            self.pickerLoaded.emit(picker, False)
+        batchItems = []
+        scene.undoEnabled = False # moves and selection of new items are undone by the loadPicker undo action
+        try:
+            while load.index < len(load.pickerItems) and (wait or time.perf_counter() - startTime < batchTime):
+                pickerItem = load.pickerItems[load.index]
+
+                if pickerItem.image:
+                    future = load.imageFutures[pickerItem.image]
+                    if not wait and not future.done(): # next batch starts with it, when it's decoded
+                        self._loadTimer.stop()
+                        break
+
+                    imageKey, image = future.result()
+                    if imageKey:
+                        ImageCacheInstance.addImage(imageKey, image) # SceneItem takes the decoded image from the cache
+                        if isinstance(imageKey, str): # content key is already hashed
+                            ImageKeyCache.set(pickerItem.image, imageKey)
+
+                item = SceneItem(pickerItem)
+                scene.addItem(item)
+
+                item.setPos(item.pickerItem.position[0], item.pickerItem.position[1])
+
+                batchItems.append(item)
+                load.index += 1
+
+            if load.asImport and batchItems: # a single selection update for the batch
+                scene.selectItems(batchItems, add=True)
+        finally:
+            load.newItems += batchItems
+            scene.undoEnabled = True
 
+        if load.transform is None and not load.asImport: # first batch is shown at once
+            self.setTransform(QTransform()) # reset scale
+            self.scale(load.picker.scale, load.picker.scale)
             self.frameAll()
+            load.transform = self.transform()
 
-        else: # track undo
+        self.loadProgress.emit(load.index, len(load.pickerItems))
+
+        if load.index == len(load.pickerItems):
+            self.completeLoad(load)
+        else:
+            load.stepTime = time.perf_counter()
+
+            load.repainted = load.stepTime - load.repaintTime > max(View.LoadRepaintInterval, 4 * load.repaintCost) # the first batch is shown at once
+            if load.repainted:
+                load.repaintTime = load.stepTime
+            self.viewport().setUpdatesEnabled(load.repainted)
+
+    def completeLoad(self, load):
+        self._loadTimer.stop()
+        self._load = None
+        self.viewport().setUpdatesEnabled(True)
+
+        scene = self.scene()
+        scene.endEditBlock()
+
+        if not load.asImport: # clear undo when just open new picker
+            scene.flushUndo()
 
-            undoFunc = lambda scene=scene, items=newItems, oldSelection=oldSelection: ([scene.removeItem(item) for item in items],
-                                                                                        scene.clearSelection(),
-                                                                                        [item.setSelected(True) for item in oldSelection])
-            scene.undoAppend("loadPicker", undoFunc)
-            self.pickerLoaded.emit(picker, True)
+            if self.transform() == load.transform: # not moved by the user while loading
+                self.frameAll()
+            self.pickerLoaded.emit(load.picker, False)
+
+        else: # track undo
+            scene.undoAppend("loadPicker", scene.itemsUndoAction(load.newItems, [], load.oldSelection))
+            self.pickerLoaded.emit(load.picker, True)
 
     def flipItems(self, edge):
         if not self.scene().editMode():
@@ -1313,13 +3108,13 @@ class View(QGraphicsView):
         selected = self.scene().sortedSelection()
 
         for item in selected: # find bounding box of selected items
-            boundingRect = boundingRect.united(item.boundingRect().translated(item.pos()))
+            boundingRect = boundingRect.united(item.shapeRect().translated(item.pos()))
 
         for item in selected[::-1]:
             if edge in ["left", "right"]:
                 anchor = boundingRect.left() if edge=="left" else boundingRect.right()
 
-                delta = abs(item.pos().x() - anchor + item.boundingRect().width())
+                delta = abs(item.pos().x() - anchor + item.shapeRect().width())
                 x = anchor - delta if edge=="left" else anchor + delta
                 item.setPos(x, item.pos().y())
                 item.pickerItem.flipped[0] = not item.pickerItem.flipped[0]
@@ -1327,7 +3122,7 @@ class View(QGraphicsView):
             elif edge in ["up", "down"]:
                 anchor = boundingRect.top() if edge=="up" else boundingRect.bottom()
 
-                delta = abs(item.pos().y() - anchor + item.boundingRect().height())
+                delta = abs(item.pos().y() - anchor + item.shapeRect().height())
                 y = anchor - delta if edge=="up" else anchor + delta
                 item.setPos(item.pos().x(), y)
                 item.pickerItem.flipped[1] = not item.pickerItem.flipped[1]
@@ -1343,22 +3138,14 @@ class View(QGraphicsView):
         self.scene().isImagesLocked = not self.scene().isImagesLocked
 
     def removeItems(self):
-        def undoRemoveItems(scene, items):
-            for item in items:
-                sceneItem = SceneItem(item)
-                scene.addItem(sceneItem)
-                sceneItem.setPos(item.position[0], item.position[1])
-
         if not self.scene().editMode():
             return
 
-        keepItems = []
-        for item in self.scene().sortedSelection():
-            keepItems.append(item.pickerItem.duplicate())
+        removedItems = self.scene().sortedSelection()
+        for item in removedItems:
             self.scene().removeItem(item)
 
-        undoFunc = lambda scene=self.scene(), items=keepItems: undoRemoveItems(scene, items)
-        self.scene().undoAppend("remove", undoFunc)
+        self.scene().undoAppend("remove", self.scene().itemsUndoAction([], removedItems, removedItems))
 
     def clipboardCopyItems(self):
         global Clipboard
@@ -1393,10 +3180,7 @@ class View(QGraphicsView):
 
                 newItems.append(item)
 
-            undoFunc = lambda items=newItems, scene=self.scene, selection=oldSelection: ([scene.removeItem(item) for item in items],
-                                                                                         scene.clearSelection(),
-                                                                                         [item.setSelected(True) for item in oldSelection])
-            self.scene().undoAppend("paste", undoFunc)
+            self.scene().undoAppend("paste", self.scene().itemsUndoAction(newItems, [], oldSelection))
 
             self.scene().updateProperties()
             Clipboard = []
@@ -1437,10 +3221,7 @@ class View(QGraphicsView):
 
             self.makeRowColumnFromSelected("column", 5)
 
-            undoFunc = lambda items=items, scene=scene, selection=oldSelection: ([scene.removeItem(item) for item in items],
-                                                                                 scene.clearSelection(),
-                                                                                 [item.setSelected(True) for item in oldSelection])
-            scene.undoAppend("insert", undoFunc)
+            scene.undoAppend("insert", scene.itemsUndoAction(items, [], oldSelection))
             scene.updateProperties()
         return items
 
@@ -1475,6 +3256,7 @@ class View(QGraphicsView):
         for item in scene.selectedItems():
             item.pickerItem.control = findSymmetricName(item.pickerItem.control)
             item.pickerItem.group = findSymmetricName(item.pickerItem.group)
+            scene.updateItemIndex(item)
 
         scene.updateProperties()
 
@@ -1502,10 +3284,7 @@ class View(QGraphicsView):
 
             scene.endEditBlock()
 
-            undoFunc = lambda scene=scene, items=newItems, oldSelection=selected: ([scene.removeItem(item) for item in items],
-                                                                                   scene.clearSelection(),
-                                                                                   [item.setSelected(True) for item in oldSelection])
-            scene.undoAppend("duplicate", undoFunc)
+            scene.undoAppend("duplicate", scene.itemsUndoAction(newItems, [], selected))
 
     def makeRowColumnFromSelected(self, orientation, size=0):
         selected = self.scene().sortedSelection()
@@ -1514,8 +3293,8 @@ class View(QGraphicsView):
 
             prev = 0
             for item in selected[1:]:
-                prevWidth = roundTo(selected[prev].boundingRect().width())
-                prevHeight = roundTo(selected[prev].boundingRect().height())
+                prevWidth = roundTo(selected[prev].shapeRect().width())
+                prevHeight = roundTo(selected[prev].shapeRect().height())
 
                 if orientation=="column":
                     item.setPos(selected[0].x(), selected[prev].y()+prevHeight+size)
@@ -1550,20 +3329,20 @@ class View(QGraphicsView):
                 elif edge == "top":
                     item.setPos(item.x(), selected[0].y())
                 elif edge == "right":
-                    anchor = selected[0].pos() + selected[0].boundingRect().bottomRight()
-                    x = anchor.x() - item.boundingRect().width()
+                    anchor = selected[0].pos() + selected[0].shapeRect().bottomRight()
+                    x = anchor.x() - item.shapeRect().width()
                     item.setPos(x, item.y())
                 elif edge == "hcenter":
-                    anchor = selected[0].pos().x() + selected[0].boundingRect().width()/2
-                    x = anchor - item.boundingRect().width()/2
+                    anchor = selected[0].pos().x() + selected[0].shapeRect().width()/2
+                    x = anchor - item.shapeRect().width()/2
                     item.setPos(x, item.y())
                 elif edge == "vcenter":
-                    anchor = selected[0].pos().y() + selected[0].boundingRect().height()/2
-                    y = anchor - item.boundingRect().height()/2
+                    anchor = selected[0].pos().y() + selected[0].shapeRect().height()/2
+                    y = anchor - item.shapeRect().height()/2
                     item.setPos(item.x(), y)
 
     def frameAll(self):
-        if self.scene().items():
+        if self.scene().items() or self.scene().isVirtualized():
             rect = self.scene().itemsBoundingRect()
             self.setSceneRect(enlargeRect(rect, 10))
             self.fitInView(self.sceneRect(), Qt.KeepAspectRatio)
@@ -1649,14 +3428,17 @@ class View(QGraphicsView):
                 if rect.width() > 3 and rect.height() > 3:
                     scene = self.scene()
                     oldSelection = scene.selectedItems()
+                    oldSelectionVersion = scene.selectionVersion()
 
                     scene.blockSignals(True)
 
+                    virtualItems = [item for item in scene.virtualItemsIn(rect) if item.sceneItem is None and item.shapeRect.intersects(rect)]
+
                     area = QPainterPath()
                     area.addRect(rect)
                     scene.setSelectionArea(area)
 
-                    newSelected = scene.selectedItems()
+                    newSelected = scene.selectedItems() + [scene.materializeItem(item) for item in virtualItems] # i.e in overview mode
                     scene.clearSelection()
 
                     if ctrl or shift: # keep previous selection in ctrl/shift modes
@@ -1677,8 +3459,7 @@ class View(QGraphicsView):
                     scene.selectionChangedCallback()
 
                     if self.selectionBeforeRubberBand:
-                        undoFunc = lambda scene=scene, items=self.selectionBeforeRubberBand[:]: (scene.clearSelection(), [item.setSelected(True) for item in items])
-                        scene.undoAppend("selection", undoFunc, str([id(item) for item in oldSelection]))
+                        scene.undoAppend("selection", scene.selectionUndoAction(self.selectionBeforeRubberBand[:]), oldSelectionVersion)
 
                 else: # clear selection
                     self.scene().clearSelection()
@@ -1763,6 +3544,88 @@ class PickerItemWidget(QWidget):
 
         painter.drawPath(self.painterPath)
 
+class ShapeLibrary(object):
+    CacheVersion = 1
+
+    def __init__(self, shapesFile, cacheFile):
+        self.shapesFile = shapesFile
+        self.cacheFile = cacheFile
+        self.shapes = {} # {name: svgpath}
+        self._sourceStamp = None
+
+    def sourceStamp(self):
+        st = os.stat(self.shapesFile)
+        return (st.st_mtime, st.st_size)
+
+    def update(self): # reload when shapes file is changed
+        stamp = self.sourceStamp()
+        if stamp == self._sourceStamp:
+            return
+
+        if not self.loadCache(stamp):
+            with open(self.shapesFile, "r") as f:
+                self.shapes = json.load(f)
+
+            self.saveCache(stamp)
+
+        self._sourceStamp = stamp
+
+    def loadCache(self, stamp):
+        if not os.path.exists(self.cacheFile):
+            return False
+
+        f = QFile(self.cacheFile)
+        if not f.open(QIODevice.ReadOnly):
+            return False
+
+        stream = QDataStream(f)
+        if stream.readInt32() != ShapeLibrary.CacheVersion or (stream.readDouble(), stream.readInt64()) != stamp:
+            f.close()
+            return False
+
+        shapes = {}
+        for _ in range(stream.readInt32()):
+            name = stream.readQString()
+            svgpath = stream.readQString()
+            painterPath = QPainterPath()
+            stream >> painterPath
+            PainterPathCache.set((svgpath, 1, 1, False, False, False), painterPath) # shape browser and new items use unit paths
+
+            shapes[name] = svgpath
+
+        ok = stream.status() == QDataStream.Ok
+        f.close()
+
+        if ok:
+            self.shapes = shapes
+        return ok
+
+    def saveCache(self, stamp):
+        f = QFile(self.cacheFile)
+        if not f.open(QIODevice.WriteOnly): # cache is optional, e.g. read-only install
+            return
+
+        stream = QDataStream(f)
+        stream.writeInt32(ShapeLibrary.CacheVersion)
+        stream.writeDouble(stamp[0])
+        stream.writeInt64(stamp[1])
+        stream.writeInt32(len(self.shapes))
+        for name, svgpath in self.shapes.items():
+            stream.writeQString(name)
+            stream.writeQString(svgpath)
+            stream << getUnitPainterPath(svgpath)
+        f.close()
+
+ShapeLibraryInstance = None
+
+def getShapeLibrary():
+    global ShapeLibraryInstance
+
+    if not ShapeLibraryInstance:
+        ShapeLibraryInstance = ShapeLibrary(RootDirectory+"/shapes.json", RootDirectory+"/shapes.cache")
+    ShapeLibraryInstance.update()
+    return ShapeLibraryInstance
+
 class ShapeBrowserWidget(QDialog):
     def __init__(self, **kwargs):
         super(ShapeBrowserWidget, self).__init__(**kwargs)
@@ -1771,8 +3634,7 @@ class ShapeBrowserWidget(QDialog):
 
         self.setWindowTitle("Select shape")
 
-        with open(RootDirectory+"/shapes.json", "r") as f:
-            shapes = json.load(f)
+        shapes = getShapeLibrary().shapes
 
         gridLayout = QGridLayout()
         gridLayout.setDefaultPositioning(10, Qt.Horizontal)
@@ -2156,6 +4018,10 @@ class MayaParameters(object):
 
         self.callbacks = []
 
+        # durations in seconds, shown in performance HUD
+        self.lastSaveTime = 0.0
+        self.lastInstallCallbacksTime = 0.0
+
 class PropertiesWindow(QDialog):
     def __init__(self):
         super(PropertiesWindow, self).__init__(parent=mayaMainWindow)
@@ -2193,12 +4059,29 @@ class DraggableButton(QPushButton):
         event.accept()
 
 class PickerWindow(QFrame): # MayaQWidgetDockableMixin
+    pickerEncoded = Signal(int, object, object) # save generation, {attribute: payload}, {attribute: digest}, emitted from a worker thread
+
+    SaveDelay = 500 # ms, saves requested within this time are written once
+    ChunkedStorage = True # items are split into chunk attributes and only changed chunks are written
+
     def __init__(self):
         super(PickerWindow, self).__init__(parent=mayaMainWindow)
 
         self.mayaParameters = MayaParameters()
         self.mayaParameters.pickerWindow = self
 
+        self._saveTimer = QTimer(self)
+        self._saveTimer.setSingleShot(True)
+        self._saveTimer.setInterval(PickerWindow.SaveDelay)
+        self._saveTimer.timeout.connect(self.startBackgroundSave)
+        self._saveGeneration = 0 # incremented by every save, results of older saves are dropped
+        self._savedGeneration = 0
+        self._savedDigests = {} # {attribute: digest} of picker attributes on the node
+        self._itemIds = {} # {id(pickerItem): (pickerItem, stable id)}, picker items are edited in place so they keep their ids
+        self._nextItemId = 0
+        self._restoredState = None # (item ids, digests) of a picker loaded from the node
+        self.pickerEncoded.connect(self.writeToMayaNode)
+
         self._stayOnTopEnabled = False
 
         self.setWindowTitle("Picker")
@@ -2216,8 +4099,14 @@ class PickerWindow(QFrame): # MayaQWidgetDockableMixin
 
         self.view = View(self.scene)
         self.view.pickerLoaded.connect(self.pickerLoaded)
+        self.view.loadProgress.connect(self.loadProgress)
+        self.view.loadFailed.connect(self.loadFailed)
         self.view.somethingDropped.connect(self.somethingDroppedOnView)        
 
+        self.loadProgressBar = QProgressBar()
+        self.loadProgressBar.setFormat("Loading %v/%m")
+        self.loadProgressBar.setVisible(False)
+
         # tool buttons
         toolsLayout = QHBoxLayout()
         openBtn = QPushButton()
@@ -2267,6 +4156,7 @@ class PickerWindow(QFrame): # MayaQWidgetDockableMixin
         mainLayout.setMenuBar(self.getMenuBar())
         mainLayout.addLayout(toolsLayout)
         mainLayout.addWidget(self.view)
+        mainLayout.addWidget(self.loadProgressBar)
         mainLayout.addWidget(self.namespaceWidget)
 
         self.updateNamespaces()
@@ -2282,13 +4172,45 @@ class PickerWindow(QFrame): # MayaQWidgetDockableMixin
             self.installCallbacks()
 
     def pickerLoaded(self, picker, asImport):
+        self.shadowsAction.setChecked(self.scene.shadowsEnabled)
+
         if not asImport:
             if self.scene.editMode():
                 self.scene.setEditMode(False)
 
-        self.saveToMayaNode()
+        if self._restoredState: # loaded from the node, so it's saved already
+            self.setSavedState(picker.items, *self._restoredState)
+            self._restoredState = None
+            self.mayaParameters.doSaveInMayaNode = True
+        else:
+            self.saveToMayaNode()
         self.installCallbacks()
 
+    def loadProgress(self, created, total):
+        self.loadProgressBar.setVisible(created != total)
+        self.loadProgressBar.setRange(0, max(total, 0)) # busy while the picker is parsed
+        self.loadProgressBar.setValue(created)
+
+    def loadFailed(self, error):
+        self._restoredState = None
+        self.mayaParameters.doSaveInMayaNode = True # paused while loading from the node, edits are saved again
+        QMessageBox.critical(self, "Picker", "Can't load picker: %s" % error)
+
+    def loadFromMayaNode(self, attribute, payloads):
+        self.mayaParameters.attributeToSave = attribute
+        self.mayaParameters.doSaveInMayaNode = False # till it's loaded, loadFailed enables it otherwise
+
+        def decode(): # run in LoadThreadPool
+            picker, itemIds, digests = decodePickerNode(payloads, attribute)
+            self._restoredState = (itemIds, digests)
+            return picker
+
+        try:
+            self.view.loadPicker(decode)
+        except Exception:
+            self.mayaParameters.doSaveInMayaNode = True
+            raise
+
     def updateNamespaces(self):
         self.namespaceWidget.blockSignals(True)
 
@@ -2342,26 +4264,111 @@ class PickerWindow(QFrame): # MayaQWidgetDockableMixin
             self.installCallbacks()
             self.saveToMayaNode()
 
-    def saveToMayaNode(self):
+    def saveToMayaNode(self, immediate=False): # saves are coalesced by a timer unless immediate
         if not self.mayaParameters.doSaveInMayaNode:
             return
 
+        if immediate:
+            self.view.finishLoad() # whole picker is saved
+            self._saveTimer.stop()
+            self._saveGeneration += 1
+            self.writeToMayaNode(self._saveGeneration, *encodePickerNode(*self.saveSnapshot()))
+        else:
+            self._saveTimer.start()
+
+    def isSavePending(self):
+        return self._saveTimer.isActive() or self._savedGeneration != self._saveGeneration
+
+    def flushSave(self): # write a pending save right now, i.e before Maya saves the scene
+        self.view.finishLoad()
+        if self.isSavePending():
+            self.saveToMayaNode(immediate=True)
+
+    def itemIds(self, items):
+        itemIds = {}
+        ids = []
+        for item in items:
+            _, uid = self._itemIds.get(id(item), (None, None))
+            if uid is None:
+                uid = self._nextItemId
+                self._nextItemId += 1
+            itemIds[id(item)] = (item, uid)
+            ids.append(uid)
+
+        self._itemIds = itemIds # removed items are forgotten
+        return ids
+
+    def setSavedState(self, items, ids, digests): # state of a picker restored from the node, so saves don't rewrite it
+        self._itemIds = {id(item): (item, uid) for item, uid in zip(items, ids)}
+        self._nextItemId = max(ids)+1 if ids else 0
+        self._savedDigests = digests
+
+    def saveAttribute(self):
+        if not self.mayaParameters.attributeToSave:
+            self.mayaParameters.attributeToSave = "data"+str(PickerWindows.index(self))
+        return self.mayaParameters.attributeToSave
+
+    def saveSnapshot(self): # arguments of encodePickerNode, the picker copy isn't changed by editing so it can be encoded in another thread
+        picker = self.view.toPicker()
+        ids = self.itemIds(picker.items)
+
+        digests = {} # attributes missing on the node, i.e in a new scene, are written again
+        if pm.objExists("picker"):
+            pickerNode = pm.PyNode("picker")
+            digests = {attr: digest for attr, digest in self._savedDigests.items() if pickerNode.hasAttr(attr)}
+
+        return PickerDocument.fromPicker(picker), ids, self.saveAttribute(), digests, PickerWindow.ChunkedStorage
+
+    def startBackgroundSave(self):
+        if not self.mayaParameters.doSaveInMayaNode or self.view.isLoading(): # saved when loading is complete
+            return
+
+        startTime = time.perf_counter()
+
+        self._saveGeneration += 1
+        generation = self._saveGeneration
+        snapshot = self.saveSnapshot()
+        self.mayaParameters.pickerIsModified = False
+
+        def encode(): # run in SaveThreadPool
+            if generation == self._saveGeneration: # skipped when a newer save is queued
+                self.pickerEncoded.emit(generation, *encodePickerNode(*snapshot))
+
+        SaveThreadPool.submit(encode)
+
+        self.mayaParameters.lastSaveTime = time.perf_counter() - startTime
+
+    def writeToMayaNode(self, generation, writes, digests): # main thread part of the save
+        if generation != self._saveGeneration: # a newer save is started
+            return
+
+        startTime = time.perf_counter()
+
         pickerNode = "picker"
         if not pm.objExists(pickerNode):
             pickerNode = pm.createNode("network", n=pickerNode)
         else:
             pickerNode = pm.PyNode(pickerNode)
 
-        pickerIdx = PickerWindows.index(self)
-        if not self.mayaParameters.attributeToSave:
-            self.mayaParameters.attributeToSave = "data"+str(pickerIdx)
+        for attr in self._savedDigests: # chunks and images that are not used anymore
+            if attr not in digests and pickerNode.hasAttr(attr):
+                pickerNode.deleteAttr(attr)
 
-        if not pickerNode.hasAttr(self.mayaParameters.attributeToSave):
-            pickerNode.addAttr(self.mayaParameters.attributeToSave, dt="string")
+        for attr, payload in writes.items():
+            if not pickerNode.hasAttr(attr):
+                pickerNode.addAttr(attr, dt="string")
+            pickerNode.attr(attr).set(payload)
 
-        picker = self.view.toPicker()
-        pickerNode.attr(self.mayaParameters.attributeToSave).set(json.dumps(picker.toJson()))
+        self._savedDigests = digests
         self.mayaParameters.pickerIsModified = False
+        self._savedGeneration = generation
+
+        self.mayaParameters.lastSaveTime = time.perf_counter() - startTime
+
+    def toggleShadows(self):
+        self.scene.setShadowsEnabled(not self.scene.shadowsEnabled)
+        self.shadowsAction.setChecked(self.scene.shadowsEnabled)
+        self.saveToMayaNode()
 
     def createNewPicker(self, window=False):
         if window:
@@ -2523,6 +4530,48 @@ class PickerWindow(QFrame): # MayaQWidgetDockableMixin
         sizeMenu.addAction(sameSizeAction)
 
         menuBar.addMenu(sizeMenu)
+
+        # view
+        viewMenu = QMenu("View", self)
+
+        updateModeMenu = QMenu("Viewport update", self)
+        updateModeGroup = QActionGroup(self)
+        for label, mode in View.UpdateModes:
+            action = QAction(label, self)
+            action.setCheckable(True)
+            action.setChecked(self.view.viewportUpdateMode() == mode)
+            action.triggered.connect(lambda _=None, mode=mode: self.view.setViewportUpdateMode(mode))
+            updateModeGroup.addAction(action)
+            updateModeMenu.addAction(action)
+        viewMenu.addMenu(updateModeMenu)
+
+        cacheBackgroundAction = QAction("Cache background", self)
+        cacheBackgroundAction.setCheckable(True)
+        cacheBackgroundAction.setChecked(self.view.cacheMode() == QGraphicsView.CacheBackground)
+        cacheBackgroundAction.triggered.connect(lambda v: self.view.setCacheMode(QGraphicsView.CacheBackground if v else QGraphicsView.CacheNone))
+        viewMenu.addAction(cacheBackgroundAction)
+
+        hudAction = QAction("Performance HUD", self)
+        hudAction.setCheckable(True)
+        hudAction.setChecked(self.view.hudEnabled)
+        hudAction.triggered.connect(lambda v: self.view.setHudEnabled(v))
+        viewMenu.addAction(hudAction)
+
+        viewMenu.addSeparator()
+
+        self.shadowsAction = QAction("Shadows", self)
+        self.shadowsAction.setCheckable(True)
+        self.shadowsAction.setChecked(self.scene.shadowsEnabled)
+        self.shadowsAction.triggered.connect(self.toggleShadows)
+        viewMenu.addAction(self.shadowsAction)
+
+        renderCacheAction = QAction("Render cache", self)
+        renderCacheAction.setCheckable(True)
+        renderCacheAction.setChecked(self.scene.renderCacheEnabled)
+        renderCacheAction.triggered.connect(lambda v: self.scene.setRenderCacheEnabled(v))
+        viewMenu.addAction(renderCacheAction)
+
+        menuBar.addMenu(viewMenu)
         return menuBar
 
     def hideEvent(self, event): # on close or minimization
@@ -2537,55 +4586,65 @@ class PickerWindow(QFrame): # MayaQWidgetDockableMixin
         super().closeEvent(event)
 
     def closeThisPicker(self):
+        self.view.finishLoad()
         self.uninstallCallbacks()
         self.scene.clear()
-        self.saveToMayaNode()
+        self.saveToMayaNode(immediate=True)
         self.close()
 
     def installCallbacks(self):
+        startTime = time.perf_counter()
+
         self.uninstallCallbacks()
 
         controlItemDict = {} # {"namespace:M_spine_1_control": [SceneItem], ...}
 
         ls = set(cmds.ls(sl=True))
 
-        skipNodes = []
-        for item in self.scene.items():
-            if isinstance(item, SceneItem) and item.pickerItem.control: # for items with controls
-                if len(splitString(item.pickerItem.control)) > 1: # skip multiple selection
-                    continue
+        skipNodes = set()
+        for control, items in self.scene.propertyIndex("control").items(): # items grouped by control, so each node is queried once
+            if not control or len(splitString(control)) > 1: # skip items without controls and multiple selection
+                continue
 
-                node = item.pickerItem.control if item.pickerItem.control.startswith(":") else self.mayaParameters.namespace+item.pickerItem.control
+            node = control if control.startswith(":") else self.mayaParameters.namespace+control
 
-                if cmds.objExists(node):
-                    node = pm.PyNode(node)
+            if not cmds.objExists(node):
+                for item in items:
+                    item.isMayaControlInvalid = True
+                    item.update()
+                continue
 
-                    item.setSelected(node.name() in ls)
+            node = pm.PyNode(node)
+            isSelected = node.name() in ls
 
-                    if node.name() not in controlItemDict:
-                        controlItemDict[node.name()] = []
-                    
-                    controlItemDict[node.name()].append(item)
+            if node.name() not in controlItemDict:
+                controlItemDict[node.name()] = []
 
-                    if cmds.objExists(node+".visibility"): # for dag nodes that can be hidden
-                        hierarchy = [node]+node.getAllParents()
-                        for n in hierarchy:
-                            if n not in skipNodes:
-                                item_ref = weakref.ref(item)
-                                callback = pm.scriptJob(ac=[n+".v", pm.Callback(mayaVisibilityCallback, n+".v", item_ref, hierarchy)], kws=True) # attribute change on visibility
-                                self.mayaParameters.callbacks.append(callback)
-                                skipNodes.append(n)
+            controlItemDict[node.name()].extend(items)
 
-                        item.isMayaControlHidden = False
-                        for h in hierarchy:
-                            if not h.v.get():
-                                item.isMayaControlHidden = True
-                                break
+            hierarchy = []
+            isHidden = False
+            if cmds.objExists(node+".visibility"): # for dag nodes that can be hidden
+                hierarchy = [node]+node.getAllParents()
+                for h in hierarchy:
+                    if not h.v.get():
+                        isHidden = True
+                        break
 
-                    item.isMayaControlInvalid = False
-                else:
-                    item.isMayaControlInvalid = True
+            for item in items:
+                item.setSelected(isSelected)
+
+                for n in hierarchy:
+                    if n not in skipNodes:
+                        item_ref = weakref.ref(item)
+                        callback = pm.scriptJob(ac=[n+".v", pm.Callback(mayaVisibilityCallback, n+".v", item_ref, hierarchy)], kws=True) # attribute change on visibility
+                        self.mayaParameters.callbacks.append(callback)
+                        skipNodes.add(n)
+
+                if hierarchy:
+                    item.isMayaControlHidden = isHidden
 
+                item.isMayaControlInvalid = False
                 item.update()
 
         scene_ref = weakref.ref(self.scene)
@@ -2594,6 +4653,8 @@ class PickerWindow(QFrame): # MayaQWidgetDockableMixin
         f = lambda: pm.scriptJob(idleEvent=self.installCallbacks, ro=True)
         self.mayaParameters.callbacks.append(pm.scriptJob(e=["SceneOpened", pm.Callback(f)], ro=True))
 
+        self.mayaParameters.lastInstallCallbacksTime = time.perf_counter() - startTime
+
     def uninstallCallbacks(self):
         for cb in self.mayaParameters.callbacks:
             if pm.scriptJob(exists=cb):
@@ -2618,6 +4679,7 @@ def restoreFromMayaNode():
 
     while PickerWindows: # clear picker windows
         w = PickerWindows.pop()
+        w.flushSave() # windows are recreated from the node
         w.uninstallCallbacks()
         w.close()
 
@@ -2625,17 +4687,17 @@ def restoreFromMayaNode():
     if pm.objExists(pickerNode):
         pickerNode = pm.PyNode(pickerNode)
         for attr in pickerNode.listAttr(ud=True, st="data*"):
-            picker = Picker()
-            picker.fromJson(json.loads(attr.get()))
-
-            if not picker.isEmpty():
-                w = PickerWindow()
-                w.mayaParameters.attributeToSave = attr.longName()
-                w.mayaParameters.doSaveInMayaNode = False
-                w.view.loadPicker(picker)
-                w.mayaParameters.doSaveInMayaNode = True
-                w.show()
-                w.view.frameAll()
+            payloads = readPickerNode(pickerNode, attr.longName())
+
+            # chunk indices and small pickers are cheap to decode to skip empty ones,
+            # whole pickers in one attribute are decoded in the background only
+            if len(payloads[attr.longName()]) < NodeIndexDecodeSize or any(name.startswith("pickerChunk_") for name in payloads):
+                if not nodeIndexItemCount(decodeNodeIndex(payloads[attr.longName()])):
+                    continue
+
+            w = PickerWindow()
+            w.loadFromMayaNode(attr.longName(), payloads) # items are decoded and created in the background
+            w.show()
 
     if PickerWindows: # use first found
         pickerWindow = PickerWindows[0]
@@ -2643,4 +4705,15 @@ def restoreFromMayaNode():
         pickerWindow = PickerWindow()
         pickerWindow.show()
 
+def flushPickerSaves(*args): # pending picker saves are written before Maya saves, opens or clears the scene
+    for w in PickerWindows:
+        w.flushSave()
+
+for callbackId in globals().get("MayaSceneCallbackIds", []): # module is reloaded
+    pymel.api.MMessage.removeCallback(callbackId)
+
+MayaSceneCallbackIds = [pymel.api.MSceneMessage.addCallback(message, flushPickerSaves) for message in [pymel.api.MSceneMessage.kBeforeSave,
+                                                                                                        pymel.api.MSceneMessage.kBeforeOpen,
+                                                                                                        pymel.api.MSceneMessage.kBeforeNew]]
+
 pickerWindow = PickerWindow()
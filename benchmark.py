@@ -0,0 +1,442 @@
+"""
+Offscreen render benchmark for pickers.
+
+Runs Scene/View/SceneItem under Qt's offscreen platform with a stand-in for
+pymel and maya.cmds, so paint cost can be measured outside of Maya:
+
+    python benchmark.py picker.picker --frames 200
+    python benchmark.py big.picker --render-cache --no-shadows --json result.json
+    python benchmark.py picker.picker --items 1000 --scenario hover --update-mode minimal
+    python benchmark.py --parse --segments 400
+
+Every scenario (pan, zoom, hover) runs N frames and reports per-frame timings,
+time spent inside SceneItem.paint and memory. Frames are painted by the view's
+viewport, so only the regions chosen by the viewport update mode are repainted.
+With --paint render the whole view is rendered into a QImage instead.
+
+With --parse only svg path parsing is timed: a long generated cubic path,
+the longest path of the picker and all shapes.json paths are parsed by
+parsePath and by the previous per-character parser.
+"""
+
+import os
+import sys
+import time
+import json
+import math
+import types
+import builtins
+import argparse
+import importlib.util
+
+RootDirectory = os.path.dirname(os.path.abspath(__file__))
+
+Scenarios = ["pan", "zoom", "hover"]
+PaintModes = ["viewport", "render"]
+UpdateModes = {"full": "Full", "minimal": "Minimal", "smart": "Smart", "bounding": "Bounding rect"} # labels of View.UpdateModes
+
+def hasPySide6():
+    return importlib.util.find_spec("PySide6") is not None
+
+def installMayaStandIn(mainWindowPointer):
+    # only what picker calls outside of Maya callbacks, everything reports an empty scene
+    noop = lambda *args, **kwargs: None
+
+    cmds = types.ModuleType("maya.cmds")
+    cmds.about = lambda *args, **kwargs: 2025 if hasPySide6() else 2024
+    cmds.ls = lambda *args, **kwargs: []
+    cmds.objExists = lambda *args, **kwargs: False
+    cmds.select = noop
+
+    maya = types.ModuleType("maya")
+    maya.cmds = cmds
+
+    core = types.ModuleType("pymel.core")
+    core.ls = lambda *args, **kwargs: []
+    core.objExists = lambda *args, **kwargs: False
+    core.namespaceInfo = lambda *args, **kwargs: []
+    core.select = noop
+    core.undoInfo = noop
+    core.scriptJob = noop
+    core.Callback = noop
+
+    class MQtUtil(object):
+        @staticmethod
+        def mainWindow():
+            return mainWindowPointer
+
+    class MSceneMessage(object):
+        kBeforeSave, kBeforeOpen, kBeforeNew = range(3)
+
+        @staticmethod
+        def addCallback(*args):
+            return 0
+
+    class MMessage(object):
+        removeCallback = staticmethod(noop)
+
+    pymel = types.ModuleType("pymel")
+    pymel.core = core
+    pymel.api = types.SimpleNamespace(MQtUtil=MQtUtil, MSceneMessage=MSceneMessage, MMessage=MMessage)
+
+    sys.modules.update({"maya": maya, "maya.cmds": cmds, "pymel": pymel, "pymel.core": core})
+    builtins.pymel = pymel # picker reaches the main window through the global pymel name, like Maya's interpreter provides
+
+def importPicker():
+    if "picker" in sys.modules:
+        return sys.modules["picker"]
+
+    spec = importlib.util.spec_from_file_location("picker", os.path.join(RootDirectory, "__init__.py"), submodule_search_locations=[RootDirectory])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["picker"] = module
+    spec.loader.exec_module(module)
+    return module
+
+def setup():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    if hasPySide6():
+        from PySide6.QtWidgets import QApplication, QMainWindow
+        from shiboken6 import getCppPointer
+    else:
+        from PySide2.QtWidgets import QApplication, QMainWindow
+        from shiboken2 import getCppPointer
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    mainWindow = QMainWindow()
+    installMayaStandIn(getCppPointer(mainWindow)[0])
+
+    picker = importPicker()
+    return app, mainWindow, picker
+
+class PaintTimer(object):
+    def __init__(self, sceneItemClass):
+        self.sceneItemClass = sceneItemClass
+        self.originalPaint = sceneItemClass.paint
+        self.calls = 0
+        self.seconds = 0.0
+
+    def install(self):
+        timer = self
+        originalPaint = self.originalPaint
+
+        def paint(item, painter, option, widget=None):
+            startTime = time.perf_counter()
+            originalPaint(item, painter, option, widget)
+            timer.seconds += time.perf_counter() - startTime
+            timer.calls += 1
+
+        self.sceneItemClass.paint = paint
+
+    def uninstall(self):
+        self.sceneItemClass.paint = self.originalPaint
+
+    def reset(self):
+        self.calls = 0
+        self.seconds = 0.0
+
+def memoryUsage(): # resident and peak memory in MB
+    current = 0.0
+    if os.path.exists("/proc/self/statm"):
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024.0 / 1024.0
+
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0 # KB on Linux
+    except ImportError:
+        peak = 0.0
+
+    return current, peak
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values)-1, int(round(p * (len(values)-1))))]
+
+def tilePicker(picker, count): # repeat items in a grid until the picker has count items
+    items = picker.items
+    if not items or len(items) >= count:
+        picker.items = items[:count]
+        return picker
+
+    xs = [item.position[0] for item in items]
+    ys = [item.position[1] for item in items]
+    width = max(xs) - min(xs) + 100
+    height = max(ys) - min(ys) + 100
+
+    copies = int(math.ceil(count / float(len(items))))
+    columns = int(math.ceil(math.sqrt(copies)))
+
+    tiled = []
+    for i in range(copies):
+        for item in items:
+            if len(tiled) == count:
+                break
+            item = item.duplicate()
+            item.position = [item.position[0] + (i % columns) * width, item.position[1] + (i // columns) * height]
+            tiled.append(item)
+
+    picker.items = tiled
+    return picker
+
+def bezierPath(segments): # closed path of cubic segments around a circle, as drawn by svg editors
+    points = []
+    for i in range(segments * 3 + 1):
+        angle = 2 * math.pi * i / (segments * 3)
+        radius = 50 + (i % 3) * 5.125
+        points.append("%.3f %.3f" % (50 + radius * math.cos(angle), 50 - radius * math.sin(angle)))
+
+    return "M %s %s Z" % (points[0], " ".join("C %s %s %s" % tuple(points[i:i+3]) for i in range(1, len(points), 3)))
+
+def parsePathByCharacters(path): # parser used before PathTokenRegexp, for comparison
+    commands = []
+
+    currentCommand = ""
+    commandNumbers = []
+    currentNumber = ""
+    sign = 1
+
+    for c in path+" ":
+        if c in ["M", "m", "L", "l", "H", "h", "V", "v", "C", "c", "Q", "q", "A", "a", "Z", "z", "T", "t", "S", "s"]:
+            if currentNumber:
+                commandNumbers.append(float(currentNumber)*sign)
+                sign = 1
+                currentNumber = ""
+
+            if currentCommand:
+                commands.append((currentCommand, commandNumbers))
+
+            commandNumbers = []
+            currentCommand = c
+            currentNumber = ""
+            sign = 1
+
+        elif c in ["0","1","2","3","4","5","6","7","8","9","."]:
+            currentNumber += c
+
+        else:
+            if currentNumber:
+                commandNumbers.append(float(currentNumber)*sign)
+                currentNumber = ""
+
+            sign = -1 if c == "-" else 1
+
+    commands.append((currentCommand, commandNumbers))
+    return commands
+
+def timeParse(func, paths, repeats): # ms per parse of all paths, best of repeats
+    best = None
+    for _ in range(repeats):
+        startTime = time.perf_counter()
+        for path in paths:
+            func(path)
+        seconds = time.perf_counter() - startTime
+        best = seconds if best is None else min(best, seconds)
+    return best * 1000
+
+def runParseBenchmark(pickerFile, repeats=100, segments=400):
+    _, _, picker = setup()
+
+    with open(os.path.join(RootDirectory, "shapes.json")) as f:
+        shapes = sorted(set(json.load(f).values()))
+
+    pickerPaths = [item.svgpath for item in picker.loadPickerFile(pickerFile).items]
+
+    pathSets = [("bezier %d segments" % segments, [bezierPath(segments)]),
+                ("longest picker path", [max(pickerPaths, key=len)] if pickerPaths else []),
+                ("shapes.json", shapes)]
+
+    results = {"picker": os.path.abspath(pickerFile), "repeats": repeats, "paths": {}}
+    for name, paths in pathSets:
+        if not paths:
+            continue
+
+        picker.clearPathCache()
+        for path in paths:
+            picker.parsePathCached(path)
+
+        results["paths"][name] = {"count": len(paths),
+                                  "characters": sum(len(path) for path in paths),
+                                  "byCharactersMs": timeParse(parsePathByCharacters, paths, repeats),
+                                  "parsePathMs": timeParse(picker.parsePath, paths, repeats),
+                                  "cachedMs": timeParse(picker.parsePathCached, paths, repeats),
+                                  "sameOutput": all(picker.parsePath(path) == [(cmd, tuple(numbers)) for cmd, numbers in parsePathByCharacters(path)] for path in paths)}
+
+    return results
+
+def printParseResults(results):
+    print("%s: svg path parsing, best of %d runs" % (results["picker"], results["repeats"]))
+    print("%-22s %6s %8s %18s %14s %8s %10s %12s" % ("paths", "count", "chars", "by characters ms", "parsePath ms", "speedup", "cached ms", "same output"))
+    for name, r in results["paths"].items():
+        print("%-22s %6d %8d %18.3f %14.3f %7.1fx %10.4f %12s" % (name, r["count"], r["characters"], r["byCharactersMs"], r["parsePathMs"],
+                                                             r["byCharactersMs"] / r["parsePathMs"], r["cachedMs"], "yes" if r["sameOutput"] else "no"))
+
+def runScenario(app, picker, view, image, scenario, frames, paint="viewport"):
+    # Qt classes are taken from the picker module, so both PySide2 and PySide6 work
+    QPainter, QPointF, QMouseEvent, QEvent, Qt = picker.QPainter, picker.QPointF, picker.QMouseEvent, picker.QEvent, picker.Qt
+
+    view.frameAll()
+    rect = view.sceneRect() # room around the items, so there is something to pan over
+    view.setSceneRect(rect.adjusted(-rect.width(), -rect.height(), rect.width(), rect.height()))
+
+    viewport = view.viewport()
+    hbar = view.horizontalScrollBar()
+    vbar = view.verticalScrollBar()
+
+    frameTimes = []
+    for i in range(frames):
+        t = i / float(max(frames-1, 1))
+
+        startTime = time.perf_counter()
+
+        if scenario == "pan":
+            hbar.setValue(int(hbar.minimum() + (hbar.maximum()-hbar.minimum()) * t))
+            vbar.setValue(int(vbar.minimum() + (vbar.maximum()-vbar.minimum()) * (1-t)))
+
+        elif scenario == "zoom":
+            factor = 1.03 if i < frames/2 else 1/1.03
+            view.scale(factor, factor)
+
+        elif scenario == "hover":
+            pos = QPointF(viewport.width() * t, viewport.height() * (0.5 + 0.4 * ((i % 20) / 20.0 - 0.5)))
+            globalPos = QPointF(viewport.mapToGlobal(pos.toPoint()))
+            app.sendEvent(viewport, QMouseEvent(QEvent.MouseMove, pos, globalPos, Qt.NoButton, Qt.NoButton, Qt.NoModifier))
+
+        if paint == "viewport": # dirty regions are repainted by the viewport as in Maya
+            app.processEvents()
+        else:
+            view.updateVirtualItems() # render() doesn't go through paintEvent
+            image.fill(Qt.white)
+            painter = QPainter(image)
+            view.render(painter)
+            painter.end()
+
+        frameTimes.append(time.perf_counter() - startTime)
+
+    return frameTimes
+
+def runBenchmark(pickerFile, frames=100, width=800, height=600, renderCache=False, shadows=None, scenarios=Scenarios,
+                 items=None, updateMode=None, paint="viewport"):
+    app, mainWindow, picker = setup()
+
+    memoryBefore, _ = memoryUsage()
+
+    startTime = time.perf_counter()
+    pickerData = picker.loadPickerFile(pickerFile) # json or binary
+    if items:
+        tilePicker(pickerData, items)
+
+    scene = picker.Scene(picker.PropertiesWidget(), picker.MayaParameters())
+    view = picker.View(scene)
+    view.resize(width, height)
+    view.show()
+    view.loadPicker(pickerData)
+    view.finishLoad() # items are created in batches otherwise
+    loadTime = time.perf_counter() - startTime
+
+    if shadows is not None:
+        scene.setShadowsEnabled(shadows)
+    scene.setRenderCacheEnabled(renderCache)
+    if updateMode:
+        view.setViewportUpdateMode(dict(picker.View.UpdateModes)[UpdateModes[updateMode]])
+    app.processEvents() # initial paint
+
+    image = picker.QImage(width, height, picker.QImage.Format_ARGB32_Premultiplied)
+
+    paintTimer = PaintTimer(picker.SceneItem)
+    paintTimer.install()
+
+    results = {"picker": os.path.abspath(pickerFile),
+               "items": len(pickerData.items),
+               "frames": frames,
+               "size": [width, height],
+               "renderCache": renderCache,
+               "updateMode": [label for label, mode in picker.View.UpdateModes if mode == view.viewportUpdateMode()][0],
+               "paint": paint,
+               "shadows": scene.shadowsEnabled,
+               "loadMs": loadTime * 1000,
+               "scenarios": {}}
+
+    try:
+        for scenario in scenarios:
+            runScenario(app, picker, view, image, scenario, 3, paint) # warm up caches
+            paintTimer.reset()
+
+            frameTimes = runScenario(app, picker, view, image, scenario, frames, paint)
+            frameMs = [t * 1000 for t in frameTimes]
+
+            results["scenarios"][scenario] = {"meanMs": sum(frameMs) / len(frameMs),
+                                              "medianMs": percentile(frameMs, 0.5),
+                                              "p95Ms": percentile(frameMs, 0.95),
+                                              "maxMs": max(frameMs),
+                                              "fps": len(frameMs) / (sum(frameMs) / 1000.0),
+                                              "paintMs": paintTimer.seconds * 1000,
+                                              "paintMsPerFrame": paintTimer.seconds * 1000 / frames,
+                                              "paintCalls": paintTimer.calls}
+    finally:
+        paintTimer.uninstall()
+
+    memoryAfter, memoryPeak = memoryUsage()
+    results["memory"] = {"residentMb": memoryAfter, "pickerMb": memoryAfter - memoryBefore, "peakMb": memoryPeak}
+    results["imageCache"] = picker.ImageCacheInstance.stats()
+    results["pathCache"] = picker.pathCacheStats()
+
+    view.hide()
+    return results
+
+def printResults(results):
+    print("%s: %d items, %d frames at %dx%d, render cache %s, shadows %s" % (results["picker"], results["items"], results["frames"],
+                                                                            results["size"][0], results["size"][1],
+                                                                            "on" if results["renderCache"] else "off",
+                                                                            "on" if results["shadows"] else "off"))
+    print("update mode: %s, paint: %s" % (results["updateMode"], results["paint"]))
+    print("load: %.1f ms" % results["loadMs"])
+    print("%-8s %10s %10s %10s %10s %8s %14s %12s" % ("scenario", "mean ms", "median ms", "p95 ms", "max ms", "fps", "paint ms/frame", "paint calls"))
+    for scenario, r in results["scenarios"].items():
+        print("%-8s %10.2f %10.2f %10.2f %10.2f %8.1f %14.2f %12d" % (scenario, r["meanMs"], r["medianMs"], r["p95Ms"], r["maxMs"], r["fps"], r["paintMsPerFrame"], r["paintCalls"]))
+
+    memory = results["memory"]
+    print("memory: %.1f MB resident, %.1f MB for picker, %.1f MB peak, image cache %.1f MB" % (memory["residentMb"], memory["pickerMb"], memory["peakMb"],
+                                                                                              results["imageCache"]["bytes"] / 1024.0 / 1024.0))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offscreen render benchmark for pickers")
+    parser.add_argument("picker", nargs="?", default=os.path.join(RootDirectory, "picker.picker"), help="json or binary picker file (bundled picker.picker by default)")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--width", type=int, default=800)
+    parser.add_argument("--height", type=int, default=600)
+    parser.add_argument("--render-cache", action="store_true", help="draw items from cached pixmaps")
+    parser.add_argument("--no-shadows", action="store_true")
+    parser.add_argument("--scenario", action="append", choices=Scenarios, help="run only given scenarios")
+    parser.add_argument("--items", type=int, help="repeat picker items in a grid up to this count")
+    parser.add_argument("--update-mode", choices=sorted(UpdateModes), help="viewport update mode (view default otherwise)")
+    parser.add_argument("--paint", choices=PaintModes, default="viewport", help="repaint dirty regions of the viewport or render whole frames")
+    parser.add_argument("--parse", action="store_true", help="time svg path parsing instead of painting, --frames is the number of runs")
+    parser.add_argument("--segments", type=int, default=400, help="cubic segments of the generated path in --parse")
+    parser.add_argument("--json", help="write results into a json file")
+    args = parser.parse_args(argv)
+
+    if args.parse:
+        results = runParseBenchmark(args.picker, args.frames, args.segments)
+        printParseResults(results)
+
+    else:
+        results = runBenchmark(args.picker, args.frames, args.width, args.height,
+                               renderCache=args.render_cache,
+                               shadows=False if args.no_shadows else None,
+                               scenarios=args.scenario or Scenarios,
+                               items=args.items,
+                               updateMode=args.update_mode,
+                               paint=args.paint)
+        printResults(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+
+    return results
+
+if __name__ == "__main__":
+    main()
+    sys.stdout.flush()
+    os._exit(0) # skip Qt teardown of the stand-in main window
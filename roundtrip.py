@@ -0,0 +1,185 @@
+"""
+Round-trip checks of picker storage formats.
+
+Runs outside of Maya with the same stand-in as benchmark.py:
+
+    python roundtrip.py
+    python roundtrip.py big.picker --items 2000
+
+Items with generated images are added to the picker, then it is written and
+read back as a binary .pickerb file, as json with shared tables, and in the
+chunked, single attribute and legacy plain json layouts of the scene node.
+Every check compares the loaded picker with the original one, the script
+exits with 1 if any of them fails.
+"""
+
+import os
+import sys
+import json
+import base64
+import shutil
+import argparse
+import tempfile
+
+import benchmark
+
+def pickerData(picker): # comparable content of a picker, images as base64 text
+    return picker.toJson()
+
+def pngImage(picker, color): # base64 of a small png, as images are stored in pickers
+    image = picker.QImage(8, 8, picker.QImage.Format_ARGB32)
+    image.fill(picker.QColor(color))
+    data = picker.QByteArray()
+    buffer = picker.QBuffer(data)
+    buffer.open(picker.QIODevice.WriteOnly)
+    image.save(buffer, "PNG")
+    return base64.b64encode(bytes(data)).decode("ascii")
+
+def addImageItems(picker, original, count=10): # one image shared by several items and one used once
+    shared = pngImage(picker, "#ff8000")
+    for i in range(count):
+        item = picker.PickerItem()
+        item.position = [i * 50, -100]
+        item.image = shared if i < count-1 else pngImage(picker, "#0080ff")
+        original.items.append(item)
+
+class Checks(object):
+    def __init__(self):
+        self.failed = []
+
+    def check(self, name, passed):
+        print("%-4s %s" % ("ok" if passed else "FAIL", name))
+        if not passed:
+            self.failed.append(name)
+
+def checkBinary(checks, picker, original, directory):
+    binaryPath = os.path.join(directory, "roundtrip.pickerb")
+    jsonPath = os.path.join(directory, "roundtrip.picker")
+
+    picker.savePickerFile(original, binaryPath)
+    checks.check("pickerb is binary", picker.isBinaryPickerFile(binaryPath))
+
+    loaded = picker.loadPickerFile(binaryPath)
+    checks.check("pickerb round trip", pickerData(loaded) == pickerData(original))
+    checks.check("pickerb raw images", all(isinstance(item.image, bytes) for item in loaded.items if item.image))
+
+    picker.convertPickerFile(binaryPath, jsonPath)
+    checks.check("pickerb to json", pickerData(picker.loadPickerFile(jsonPath)) == pickerData(original))
+
+    picker.convertPickerFile(jsonPath, binaryPath)
+    checks.check("json to pickerb", pickerData(picker.loadPickerFile(binaryPath)) == pickerData(original))
+
+    with open(binaryPath, "rb") as f:
+        checks.check("pickerb from bytes", pickerData(picker.readPickerBinary(f.read())) == pickerData(original))
+
+def checkSharedTables(checks, picker, original, directory):
+    data = original.toJson(sharedTables=True)
+    loaded = picker.Picker()
+    loaded.fromJson(json.loads(json.dumps(data)))
+    checks.check("shared tables round trip", pickerData(loaded) == pickerData(original))
+
+    document = picker.PickerDocument.fromPicker(original)
+    checks.check("document shared tables", document.toJson(sharedTables=True) == data)
+    checks.check("document without tables", document.toJson() == original.toJson())
+    checks.check("document json text", document.toJsonText() == json.dumps(document.toJson()))
+    checks.check("document to picker", pickerData(document.toPicker()) == pickerData(original))
+
+    jsonPath = os.path.join(directory, "shared.picker")
+    picker.savePickerFile(original, jsonPath, sharedTables=True)
+    with open(jsonPath) as f:
+        checks.check("shared tables file", "shapes" in json.load(f))
+    checks.check("shared tables file round trip", pickerData(picker.loadPickerFile(jsonPath)) == pickerData(original))
+
+def checkChunkedNode(checks, picker, original):
+    attribute = "data0"
+    ids = [uid * 3 for uid in reversed(range(len(original.items)))] # ids with gaps in other than chunk order
+    document = picker.PickerDocument.fromPicker(original)
+
+    writes, digests = picker.encodePickerNode(document, ids, attribute, {})
+    checks.check("chunked node attributes", attribute in writes and any(attr.startswith("pickerChunk_") for attr in writes))
+    checks.check("chunked node images once", len([attr for attr in writes if attr.startswith("pickerImage_")]) == len(set(item.image for item in original.items if item.image)))
+
+    loaded, loadedIds, loadedDigests = picker.decodePickerNode(writes, attribute)
+    checks.check("chunked node round trip", pickerData(loaded) == pickerData(original))
+    checks.check("chunked node ids", loadedIds == ids)
+    checks.check("chunked node digests", loadedDigests == digests)
+
+    unchanged, _ = picker.encodePickerNode(document, ids, attribute, digests)
+    checks.check("chunked node unchanged save", not unchanged)
+
+    if not original.items:
+        return
+
+    edited = original.duplicate()
+    edited.items[0].label = (edited.items[0].label or "") + " edited"
+    changed, changedDigests = picker.encodePickerNode(picker.PickerDocument.fromPicker(edited), ids, attribute, digests)
+    checks.check("chunked node edit writes one chunk", list(changed) == [picker.nodeChunkAttribute(attribute, ids[0] // picker.NodeChunkSize)])
+
+    payloads = dict(writes)
+    payloads.update(changed)
+    loaded, _, loadedDigests = picker.decodePickerNode(payloads, attribute)
+    checks.check("chunked node edit round trip", pickerData(loaded) == pickerData(edited))
+    checks.check("chunked node edit digests", loadedDigests == changedDigests)
+
+def checkSingleNode(checks, picker, original):
+    attribute = "data0"
+    document = picker.PickerDocument.fromPicker(original)
+
+    writes, digests = picker.encodePickerNode(document, list(range(len(original.items))), attribute, {}, chunked=False)
+    checks.check("single node attributes", list(writes) == [attribute] and writes[attribute].startswith(picker.NodePayloadMarker))
+
+    loaded, ids, _ = picker.decodePickerNode(writes, attribute)
+    checks.check("single node round trip", pickerData(loaded) == pickerData(original))
+    checks.check("single node item count", picker.nodeIndexItemCount(picker.decodeNodeIndex(writes[attribute])) == len(original.items))
+
+def checkLegacyNode(checks, picker, original):
+    attribute = "data0"
+    payloads = {attribute: json.dumps(original.toJson())} # plain json written by older versions
+
+    loaded, ids, _ = picker.decodePickerNode(payloads, attribute)
+    checks.check("legacy node round trip", pickerData(loaded) == pickerData(original))
+    checks.check("legacy node item count", picker.nodeIndexItemCount(picker.decodeNodeIndex(payloads[attribute])) == len(original.items))
+
+    newer = "%s%d:" % (picker.NodePayloadMarker, picker.NodePayloadVersion+1)
+    try:
+        picker.unpackNodePayload(newer)
+        checks.check("newer node version rejected", False)
+    except ValueError:
+        checks.check("newer node version rejected", True)
+
+def runRoundTrip(pickerFile, items=None):
+    _, _, picker = benchmark.setup()
+
+    original = picker.loadPickerFile(pickerFile)
+    if items:
+        benchmark.tilePicker(original, items)
+    addImageItems(picker, original)
+
+    print("%s, %d items" % (os.path.abspath(pickerFile), len(original.items)))
+
+    checks = Checks()
+    directory = tempfile.mkdtemp(prefix="picker_roundtrip_")
+    try:
+        checkBinary(checks, picker, original, directory)
+        checkSharedTables(checks, picker, original, directory)
+        checkChunkedNode(checks, picker, original)
+        checkSingleNode(checks, picker, original)
+        checkLegacyNode(checks, picker, original)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print("%d failed" % len(checks.failed) if checks.failed else "all passed")
+    return checks.failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Round-trip checks of picker storage formats")
+    parser.add_argument("picker", nargs="?", default=os.path.join(benchmark.RootDirectory, "picker.picker"), help="json or binary picker file (bundled picker.picker by default)")
+    parser.add_argument("--items", type=int, default=300, help="repeat picker items in a grid up to this count, so the node has several chunks")
+    args = parser.parse_args(argv)
+
+    return runRoundTrip(args.picker, args.items)
+
+if __name__ == "__main__":
+    failed = main()
+    sys.stdout.flush()
+    os._exit(1 if failed else 0) # skip Qt teardown of the stand-in main window